@@ -0,0 +1,156 @@
+"""
+Content-addressed blob storage on local disk.
+Each blob is written once under the SHA-256 hex digest of its bytes.
+"""
+
+from contextlib import asynccontextmanager
+import anyio
+import hashlib
+import os
+import re
+import tempfile
+from .config import get_settings
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+_MAGIC = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def is_digest(value: str) -> bool:
+    return bool(_DIGEST_RE.match(value))
+
+
+def sniff_mime(head: bytes) -> str | None:
+    """Guess an image mime type from the first bytes of a file"""
+    for magic, mime in _MAGIC:
+        if head.startswith(magic):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+class BlobTooLarge(Exception):
+    pass
+
+
+class BlobStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    def path_for(self, digest: str, suffix: str = "") -> str:
+        if not is_digest(digest):
+            raise ValueError("invalid blob digest")
+        return os.path.join(self.root, digest + suffix)
+
+    def _temp_path(self) -> str:
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        os.close(fd)
+        return tmp
+
+    def _publish(self, tmp: str, digest: str, suffix: str) -> str:
+        path = self.path_for(digest, suffix)
+        if os.path.exists(path):
+            os.unlink(tmp)
+        else:
+            # Atomic publish so readers never see a partial blob
+            os.replace(tmp, path)
+        return digest
+
+    def put(self, data: bytes, suffix: str = "") -> str:
+        """Store bytes and return their digest; existing blobs are left untouched"""
+        digest = hashlib.sha256(data).hexdigest()
+        if os.path.exists(self.path_for(digest, suffix)):
+            return digest
+        tmp = self._temp_path()
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            return self._publish(tmp, digest, suffix)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    async def put_stream(self, source, max_bytes: int, suffix: str = "") -> str:
+        """
+        Copy an async readable (e.g. UploadFile) into the store chunk by chunk,
+        hashing as it goes. Raises BlobTooLarge as soon as max_bytes is exceeded.
+        """
+        async with self.writer(max_bytes) as writer:
+            while chunk := await source.read(CHUNK_SIZE):
+                await writer.write(chunk)
+            return await writer.publish(suffix)
+
+    @asynccontextmanager
+    async def writer(self, max_bytes: int):
+        """A BlobWriter for bytes that arrive piecemeal; discarded on exit unless published"""
+        tmp = await anyio.to_thread.run_sync(self._temp_path)
+        writer = BlobWriter(self, tmp, max_bytes, await anyio.open_file(tmp, "wb"))
+        try:
+            yield writer
+        finally:
+            await writer.discard()
+
+    def stat(self, digest: str) -> tuple[str, str] | None:
+        """Return (path, mime type) for a stored blob, or None if it is missing"""
+        path = self.path_for(digest)
+        try:
+            with open(path, "rb") as f:
+                head = f.read(16)
+        except FileNotFoundError:
+            return None
+        return path, sniff_mime(head) or "application/octet-stream"
+
+
+class BlobWriter:
+    """A blob being written: hashed on the way into a temp file, stored once published"""
+
+    def __init__(self, store: BlobStore, tmp: str, max_bytes: int, file):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.size = 0
+        # Enough of the start of the file for sniff_mime
+        self.head = b""
+        self._tmp = tmp
+        self._file = file
+        self._digest = hashlib.sha256()
+
+    async def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise BlobTooLarge()
+        if len(self.head) < 16:
+            self.head = (self.head + chunk)[:16]
+        self._digest.update(chunk)
+        await self._file.write(chunk)
+
+    async def flush(self) -> str:
+        """Put everything written so far on disk and return the temp file, to inspect before publishing"""
+        await self._file.flush()
+        return self._tmp
+
+    async def publish(self, suffix: str = "") -> str:
+        await self._file.aclose()
+        digest = await anyio.to_thread.run_sync(self.store._publish, self._tmp, self._digest.hexdigest(), suffix)
+        self._tmp = None
+        return digest
+
+    async def discard(self):
+        await self._file.aclose()
+        if self._tmp is not None and os.path.exists(self._tmp):
+            os.unlink(self._tmp)
+        self._tmp = None
+
+
+photo_store = BlobStore(get_settings().blob_dir)
@@ -1,13 +1,91 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
+from functools import lru_cache
+import os
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# "METHOD /path" -> {key: "requests/seconds"}; key is "ip" or a body field such as "mobile_no"
+# (form bodies are counted by their handler, see common.ratelimit.limit_fields)
+DEFAULT_RATE_LIMITS = {
+    "POST /auth/send-otp": {"ip": "10/60", "mobile_no": "3/300"},
+    # Register checks the OTP, so guesses are also capped per number, whatever IPs they come from
+    "POST /auth/register": {"ip": "10/60", "mobile_no": "5/300"},
+    "POST /auth/register/multipart": {"ip": "10/60", "mobile_no": "5/300"},
+    "POST /auth/login": {"ip": "30/60", "mobile_no": "10/300"},
+}
 
 
 class Settings(BaseSettings):
     database_url: str = Field(default="", alias="DATABASE_URL")
+    database_read_url: str = Field(default="", alias="DATABASE_READ_URL")  # optional replica for reads
+    db_pool_warmup: int = Field(default=2, alias="DB_POOL_WARMUP")  # connections opened at startup
+    db_pool_size: int = Field(default=5, alias="DB_POOL_SIZE")  # per engine; the replica gets its own pool
+    db_max_overflow: int = Field(default=10, alias="DB_MAX_OVERFLOW")
+    db_pool_timeout: float = Field(default=30, alias="DB_POOL_TIMEOUT")  # seconds to wait for a connection
+    db_pool_recycle: int = Field(default=300, alias="DB_POOL_RECYCLE")  # seconds before a connection is replaced
+    # pre_ping: test every checkout (one round trip each) | background: ping idle connections every
+    # DB_POOL_VALIDATE_INTERVAL seconds; note the pings keep a scale-to-zero database awake
+    db_pool_health: str = Field(default="pre_ping", alias="DB_POOL_HEALTH")
+    db_pool_validate_interval: float = Field(default=30, alias="DB_POOL_VALIDATE_INTERVAL")
+    db_read_your_writes_seconds: float = Field(default=5, alias="DB_READ_YOUR_WRITES_SECONDS")  # primary reads after a write
     jwt_secret: str = Field(default="change-me", alias="JWT_SECRET")
     jwt_algorithm: str = Field(default="HS256", alias="JWT_ALGORITHM")
     otp_expiry_seconds: int = Field(default=300, alias="OTP_EXPIRY_SECONDS")
+    otp_backend: str = Field(default="memory", alias="OTP_BACKEND")  # memory | postgres
+    otp_sweep_interval_seconds: int = Field(default=60, alias="OTP_SWEEP_INTERVAL_SECONDS")
+    blob_dir: str = Field(default=os.path.join(BASE_DIR, "blobs"), alias="BLOB_DIR")
+    upload_dir: str = Field(default=os.path.join(BASE_DIR, "uploads"), alias="UPLOAD_DIR")
+    upload_max_bytes: int = Field(default=10 * 1024 * 1024, alias="UPLOAD_MAX_BYTES")
+    image_cache_dir: str = Field(default=os.path.join(BASE_DIR, "image_cache"), alias="IMAGE_CACHE_DIR")
+    image_cache_max_bytes: int = Field(default=256 * 1024 * 1024, alias="IMAGE_CACHE_MAX_BYTES")
+    # Width x height; larger images are refused at upload and never decoded (~4 bytes a pixel once decoded)
+    image_max_pixels: int = Field(default=40_000_000, alias="IMAGE_MAX_PIXELS")
+    # argon2 cost; changing these rehashes passwords transparently on next login
+    argon2_time_cost: int = Field(default=3, alias="ARGON2_TIME_COST")
+    argon2_memory_cost: int = Field(default=65536, alias="ARGON2_MEMORY_COST")
+    argon2_parallelism: int = Field(default=4, alias="ARGON2_PARALLELISM")
+    hash_workers: int = Field(default=0, alias="HASH_WORKERS")  # 0 = one per CPU core
+    hash_max_pending: int = Field(default=0, alias="HASH_MAX_PENDING")  # 0 = 8 per worker
+    token_cache_size: int = Field(default=10000, alias="TOKEN_CACHE_SIZE")
+    token_cache_ttl_seconds: int = Field(default=300, alias="TOKEN_CACHE_TTL_SECONDS")
+    admin_token: str = Field(default="", alias="ADMIN_TOKEN")  # empty disables /admin
+    import_batch_size: int = Field(default=1000, alias="IMPORT_BATCH_SIZE")
+    import_max_bytes: int = Field(default=256 * 1024 * 1024, alias="IMPORT_MAX_BYTES")
+    export_batch_size: int = Field(default=1000, alias="EXPORT_BATCH_SIZE")
+    log_level: str = Field(default="INFO", alias="LOG_LEVEL")
+    log_format: str = Field(default="json", alias="LOG_FORMAT")  # json | text
+    log_sample_debug: float = Field(default=0.1, alias="LOG_SAMPLE_DEBUG")  # fraction of DEBUG records kept
+    log_queue_size: int = Field(default=10000, alias="LOG_QUEUE_SIZE")
+    rate_limits: dict[str, dict[str, str]] = Field(default=DEFAULT_RATE_LIMITS, alias="RATE_LIMITS")  # JSON
+    rate_limit_backend: str = Field(default="memory", alias="RATE_LIMIT_BACKEND")  # memory | sqlite
+    rate_limit_sqlite_path: str = Field(default=os.path.join(BASE_DIR, "ratelimit.db"), alias="RATE_LIMIT_SQLITE_PATH")
+    rate_limit_max_keys: int = Field(default=100000, alias="RATE_LIMIT_MAX_KEYS")
+    # Proxies in front of the app that append to X-Forwarded-For (1 on Render); 0 uses the socket peer
+    rate_limit_trusted_hops: int = Field(default=0, alias="RATE_LIMIT_TRUSTED_HOPS")
+    max_concurrent_requests: int = Field(default=256, alias="MAX_CONCURRENT_REQUESTS")  # 0 = unlimited
+    profile_cache_max_bytes: int = Field(default=32 * 1024 * 1024, alias="PROFILE_CACHE_MAX_BYTES")  # 0 disables
+    profile_cache_ttl_seconds: int = Field(default=300, alias="PROFILE_CACHE_TTL_SECONDS")
+    profile_cache_notify: bool = Field(default=True, alias="PROFILE_CACHE_NOTIFY")  # LISTEN for changes on Postgres
+    # Direct (non-pooled) Postgres URL to LISTEN on; only then do cache hits skip the version check.
+    # Through a pooler (Neon's -pooler hosts, pgbouncer) LISTEN succeeds but notifications never arrive
+    profile_cache_listen_url: str = Field(default="", alias="PROFILE_CACHE_LISTEN_URL")
+    search_backend: str = Field(default="database", alias="SEARCH_BACKEND")  # database | memory
+    search_typo_threshold: float = Field(default=0.3, alias="SEARCH_TYPO_THRESHOLD")  # pg_trgm word similarity
 
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Process-wide settings; env and .env are read once"""
+    return Settings()
+
+
+def reload_settings() -> Settings:
+    """Re-read env and .env, e.g. after rotating JWT_SECRET"""
+    get_settings.cache_clear()
+    return get_settings()
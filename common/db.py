@@ -1,58 +1,186 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker, declarative_base
-from .config import Settings
+from collections import OrderedDict
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import declarative_base
+from time import monotonic
+from .config import get_settings
+from . import metrics
+import asyncio
 import logging
-import os
 
 Engine = None
-SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+# Set only when DATABASE_READ_URL is configured; ReadSessionLocal falls back to the primary otherwise
+ReadEngine = None
+SessionLocal = async_sessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
+ReadSessionLocal = async_sessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
-def ensure_engine():
-    global Engine
-    if Engine is None:
-        s = Settings()
+_engine_lock = asyncio.Lock()
+_validators = []
+# user id -> monotonic deadline; until then that user's reads go to the primary
+_recent_writes: OrderedDict = OrderedDict()
+
+
+def _async_database_url(database_url: str) -> str:
+    if database_url.startswith('postgresql://'):
+        # psycopg3 ships both the sync and the asyncio driver; create_async_engine
+        # picks the async one for postgresql+psycopg://
+        return database_url.replace('postgresql://', 'postgresql+psycopg://', 1)
+    if database_url.startswith('sqlite:///'):
+        # Local stand-in for benchmarks and development; needs aiosqlite (requirements-dev.txt)
+        return database_url.replace('sqlite:///', 'sqlite+aiosqlite:///', 1)
+    raise ValueError("Invalid database URL format - must be postgresql:// or sqlite:///")
+
+
+async def _warm_pool(engine, connections: int):
+    async def checkout():
+        conn = await engine.connect()
+        await conn.execute(text("SELECT 1"))
+        return conn
+
+    # Hold them all at once so the pool really opens `connections` sockets
+    conns = await asyncio.gather(*(checkout() for _ in range(connections)))
+    for conn in conns:
+        await conn.close()
+
+
+def _create_engine(database_url: str):
+    s = get_settings()
+    url = _async_database_url(database_url)
+    if url.startswith('sqlite'):
+        # A file database; its driver's own pool is the right one
+        return create_async_engine(url, echo=False)
+    if s.db_pool_health not in ("pre_ping", "background"):
+        raise RuntimeError(f"Unknown DB_POOL_HEALTH: {s.db_pool_health}")
+    return create_async_engine(
+        url,
+        # background: no round trip on checkout; _validate_idle_forever pings idle connections instead
+        pool_pre_ping=s.db_pool_health == "pre_ping",
+        pool_recycle=s.db_pool_recycle,
+        echo=False,
+        pool_size=s.db_pool_size,
+        max_overflow=s.db_max_overflow,
+        pool_timeout=s.db_pool_timeout,
+        poolclass=metrics.TimedQueuePool,
+    )
+
+
+async def _validate_idle_forever(engine, interval: float):
+    """Ping each idle pooled connection once per interval, so a dead one is replaced before a request gets it"""
+    pool = engine.sync_engine.pool
+    while True:
+        await asyncio.sleep(interval)
+        # The pool is FIFO: checking out and returning the head visits every idle connection once
+        for _ in range(pool.checkedin()):
+            if not pool.checkedin():
+                break  # requests took the rest; they are evidently fine
+            try:
+                async with engine.connect() as conn:
+                    await conn.exec_driver_sql("SELECT 1")
+            except Exception as e:
+                # SQLAlchemy has already invalidated the connection if it was a disconnect
+                logging.warning("Idle connection failed validation: %s", e)
+
+
+async def _open_engine(database_url: str, name: str):
+    s = get_settings()
+    engine = _create_engine(database_url)
+    metrics.instrument_engine(engine, name)
+    # Test connection and pre-fill the pool so early requests skip the TLS/auth handshake
+    await _warm_pool(engine, max(1, min(s.db_pool_warmup, s.db_pool_size)))
+    logging.info("Database connection successful (%s, %s)", name, engine.dialect.name)
+    if s.db_pool_health == "background" and engine.dialect.name != "sqlite":
+        _validators.append(asyncio.get_running_loop().create_task(
+            _validate_idle_forever(engine, s.db_pool_validate_interval)
+        ))
+    return engine
+
+
+async def ensure_engine():
+    """Create the engine, warm the pool and bring the schema up to date; run once at startup"""
+    global Engine, ReadEngine
+    if Engine is not None:
+        return
+    async with _engine_lock:
+        if Engine is not None:
+            return
+        s = get_settings()
         if not s.database_url:
             raise RuntimeError("DATABASE_URL not configured")
-        
+
         try:
-            # Force PostgreSQL connection using psycopg3
-            connection_string = s.database_url
-            if connection_string.startswith('postgresql://'):
-                # Convert to psycopg3 driver for Python 3.13 compatibility
-                # Replace postgresql:// with postgresql+psycopg://
-                psycopg3_connection_string = connection_string.replace('postgresql://', 'postgresql+psycopg://', 1)
-                
-                Engine = create_engine(
-                    psycopg3_connection_string,
-                    pool_pre_ping=True,
-                    pool_recycle=300,
-                    echo=False,
-                    pool_size=5,
-                    max_overflow=10
-                )
-                
-                # Test connection
-                with Engine.connect() as conn:
-                    result = conn.execute(text("SELECT 1"))
-                    result.fetchone()
-                
-                logging.info("PostgreSQL connection successful")
-                
-                # Create tables if they don't exist
-                Base.metadata.create_all(bind=Engine)
-                logging.info("Database tables ensured")
-                
-                # Run profile photo migration
-                from .migrations import run_profile_photo_migration
-                run_profile_photo_migration(SessionLocal())
-                
-            else:
-                raise ValueError("Invalid database URL format - must be postgresql://")
-                
+            engine = await _open_engine(s.database_url, "primary")
+
+            # Create tables and apply pending migrations, unless the schema is already current
+            from .migrations import schema_is_current, run_migrations
+            async with engine.connect() as conn:
+                current = await conn.run_sync(schema_is_current)
+            if not current:
+                async with engine.begin() as conn:
+                    await conn.run_sync(run_migrations)
+            logging.info("Database schema ensured")
+
+            SessionLocal.configure(bind=engine)
+
+            read_engine = None
+            if s.database_read_url:
+                # Migrations ran on the primary; the replica only ever serves reads
+                read_engine = await _open_engine(s.database_read_url, "replica")
+            ReadSessionLocal.configure(bind=read_engine or engine)
+
         except Exception as e:
-            logging.error(f"PostgreSQL connection failed: {e}")
-            # Don't fallback to SQLite - we want to use Neon PostgreSQL
-            raise RuntimeError(f"Failed to connect to PostgreSQL database: {e}")
-        
-        SessionLocal.configure(bind=Engine)
\ No newline at end of file
+            logging.error("Database connection failed: %s", e)
+            # Never fall back to another database; SQLite is only used when configured explicitly
+            raise RuntimeError(f"Failed to connect to database: {e}")
+
+        Engine = engine
+        ReadEngine = read_engine
+
+
+async def dispose_engine():
+    global Engine, ReadEngine
+    for task in _validators:
+        task.cancel()
+    _validators.clear()
+    if ReadEngine is not None:
+        await ReadEngine.dispose()
+        ReadEngine = None
+    if Engine is not None:
+        await Engine.dispose()
+        Engine = None
+
+
+async def get_db():
+    # The app lifespan has already created the engine; no per-request setup
+    if Engine is None:
+        raise RuntimeError("Database engine not initialised; is the app lifespan running?")
+    async with SessionLocal() as db:
+        yield db
+
+
+async def get_read_db():
+    """A session on the replica when DATABASE_READ_URL is set; use only for requests that do not write"""
+    if Engine is None:
+        raise RuntimeError("Database engine not initialised; is the app lifespan running?")
+    async with ReadSessionLocal() as db:
+        yield db
+
+
+def mark_written(uid):
+    """Route uid's reads to the primary for a while, so replica lag cannot hide what was just written"""
+    if ReadEngine is None:
+        return
+    now = monotonic()
+    _recent_writes[uid] = now + get_settings().db_read_your_writes_seconds
+    _recent_writes.move_to_end(uid)
+    # Every entry gets the same window, so the oldest deadlines are at the front
+    while _recent_writes and next(iter(_recent_writes.values())) <= now:
+        _recent_writes.popitem(last=False)
+
+
+def read_session(uid) -> AsyncSession:
+    """A session for reading uid's own data: the primary right after uid wrote, otherwise the replica"""
+    deadline = _recent_writes.get(uid)
+    if deadline is not None and deadline > monotonic():
+        return SessionLocal()
+    return ReadSessionLocal()
@@ -0,0 +1,145 @@
+"""
+Streaming multipart/form-data parsing for uploads.
+Request.form() spools every file part to a temporary file before the
+endpoint runs, so a body without Content-Length (chunked) was read in full
+before any limit applied, and the upload was then copied a second time into
+the blob store. stream_form feeds the raw request stream to python-multipart
+and writes the one expected file part straight into a BlobWriter, counting
+bytes as they arrive.
+"""
+
+from contextlib import AsyncExitStack, asynccontextmanager
+from fastapi import HTTPException, Request
+from multipart.multipart import MultipartParseError, MultipartParser, parse_options_header
+from starlette.datastructures import FormData
+from urllib.parse import parse_qsl
+from .blobstore import BlobStore, BlobTooLarge, BlobWriter, sniff_mime
+from .schemas import check_form_size
+
+
+class StreamedFile:
+    """The file part of a streamed form, held in a temp file until saved"""
+
+    def __init__(self, filename: str, content_type: str | None, writer: BlobWriter):
+        self.filename = filename
+        self.content_type = content_type
+        self._writer = writer
+
+    @property
+    def size(self) -> int:
+        return self._writer.size
+
+    @property
+    def mime_type(self) -> str | None:
+        """Sniffed from the first bytes, not the client's Content-Type"""
+        return sniff_mime(self._writer.head)
+
+    async def local_path(self) -> str:
+        """The temp file holding the upload so far, for checks before it is saved"""
+        return await self._writer.flush()
+
+    async def save(self, suffix: str = "") -> str:
+        """Publish to the blob store and return the digest"""
+        return await self._writer.publish(suffix)
+
+
+@asynccontextmanager
+async def stream_form(request: Request, store: BlobStore, file_field: str, max_file_bytes: int, max_field_bytes: int):
+    """
+    Yield (text fields, StreamedFile or None). The whole body may not exceed
+    max_file_bytes + max_field_bytes and the file part not max_file_bytes;
+    either is a 413 as soon as it is passed. An unsaved file is removed on exit.
+    An urlencoded body (a form without a file) yields its fields and None.
+    """
+    max_body_bytes = max_file_bytes + max_field_bytes
+    check_form_size(request, max_body_bytes)
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type == b"application/x-www-form-urlencoded":
+        # Text fields only, as clients send a form without a file
+        body = bytearray()
+        async for chunk in request.stream():
+            body += chunk
+            if len(body) > max_field_bytes:
+                raise HTTPException(status_code=413, detail="file_too_large")
+        yield FormData(parse_qsl(body.decode("latin-1"), keep_blank_values=True)), None
+        return
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise HTTPException(status_code=400, detail="multipart_form_required")
+
+    # The parser's callbacks are synchronous; they queue events that are handled after each chunk
+    events = []
+    header = {"field": b"", "value": b""}
+    headers = {}
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header["field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        headers[header["field"].lower()] = header["value"]
+        header["field"] = header["value"] = b""
+
+    def on_headers_finished():
+        events.append(("part", dict(headers)))
+        headers.clear()
+
+    callbacks = {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+        "on_part_end": lambda: events.append(("end", None)),
+        "on_end": lambda: events.append(("done", None)),
+    }
+    parser = MultipartParser(params[b"boundary"], callbacks)
+
+    fields = []
+    upload = None
+    async with AsyncExitStack() as stack:
+        name = value = writer = None
+        received = 0
+        done = False
+        try:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > max_body_bytes:
+                    raise BlobTooLarge()
+                parser.write(chunk)
+                for kind, data in events:
+                    if kind == "part":
+                        _, options = parse_options_header(data.get(b"content-disposition", b""))
+                        name = options.get(b"name", b"").decode("latin-1")
+                        if b"filename" not in options:
+                            value = bytearray()
+                            continue
+                        if name != file_field or upload is not None:
+                            raise HTTPException(status_code=400, detail="unexpected_file_part")
+                        writer = await stack.enter_async_context(store.writer(max_file_bytes))
+                        upload = StreamedFile(
+                            options[b"filename"].decode("utf-8", "replace"),
+                            data.get(b"content-type", b"").decode("latin-1") or None,
+                            writer,
+                        )
+                    elif kind == "data":
+                        if writer is not None:
+                            await writer.write(data)
+                        else:
+                            value += data
+                    elif kind == "done":
+                        done = True
+                    elif writer is not None:
+                        writer = None
+                    else:
+                        fields.append((name, value.decode("utf-8", "replace")))
+                events.clear()
+        except BlobTooLarge:
+            raise HTTPException(status_code=413, detail="file_too_large")
+        except MultipartParseError:
+            raise HTTPException(status_code=400, detail="invalid_multipart")
+        # A truncated body would otherwise leave a partial file behind as if it were complete
+        if not done:
+            raise HTTPException(status_code=400, detail="invalid_multipart")
+        yield FormData(fields), upload
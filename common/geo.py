@@ -0,0 +1,102 @@
+"""
+Geohash helpers for the nearby-vendors search.
+Profiles store a geohash of their location in an indexed column; a radius
+query is turned into the handful of geohash cells covering its bounding box
+(each an index range scan), then filtered, sorted and paged by exact
+distance in the same query.
+"""
+
+from sqlalchemy import Float, func
+import math
+
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_KM = 6371.0088
+STORED_PRECISION = 9
+# Upper bound on cells per query; keeps the OR of index ranges small
+MAX_COVER_CELLS = 16
+
+
+def encode(lat: float, lng: float, precision: int = STORED_PRECISION) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                value = value * 2 + 1
+                lng_lo = mid
+            else:
+                value *= 2
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value = value * 2 + 1
+                lat_lo = mid
+            else:
+                value *= 2
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> tuple[float, float]:
+    """(height, width) in degrees of a geohash cell"""
+    total = 5 * precision
+    lng_bits = (total + 1) // 2
+    lat_bits = total // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1 = math.radians(lat1)
+    p2 = math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_km_sql(lat: float, lng: float, lat_column, lng_column):
+    """haversine_km from a fixed point as a SQL expression over two columns"""
+    p1 = math.radians(lat)
+    p2 = func.radians(lat_column, type_=Float)
+    dl = func.radians(lng_column, type_=Float) - math.radians(lng)
+    sin_dp = func.sin((p2 - p1) * 0.5, type_=Float)
+    sin_dl = func.sin(dl * 0.5, type_=Float)
+    a = sin_dp * sin_dp + math.cos(p1) * func.cos(p2, type_=Float) * sin_dl * sin_dl
+    # No clamp as in haversine_km: a only nears 1 for points half the globe apart
+    return 2 * EARTH_RADIUS_KM * func.asin(func.sqrt(a, type_=Float), type_=Float)
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> tuple[float, float, float, float]:
+    """(south, west, north, east) enclosing the circle"""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    coslat = max(math.cos(math.radians(lat)), 1e-6)
+    dlng = min(180.0, math.degrees(radius_km / (EARTH_RADIUS_KM * coslat)))
+    return max(-90.0, lat - dlat), max(-180.0, lng - dlng), min(90.0, lat + dlat), min(180.0, lng + dlng)
+
+
+def cover(lat: float, lng: float, radius_km: float) -> list[str]:
+    """Geohash prefixes whose cells together cover the circle's bounding box"""
+    south, west, north, east = bounding_box(lat, lng, radius_km)
+    for precision in range(STORED_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = range(math.floor((south + 90) / height), math.floor((north + 90) / height) + 1)
+        cols = range(math.floor((west + 180) / width), math.floor((east + 180) / width) + 1)
+        if len(rows) * len(cols) <= MAX_COVER_CELLS:
+            return sorted({
+                encode(-90 + (r + 0.5) * height, -180 + (c + 0.5) * width, precision)
+                for r in rows for c in cols
+            })
+    return [""]
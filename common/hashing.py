@@ -0,0 +1,123 @@
+"""
+Async password hashing backed by a process pool.
+argon2 is CPU bound and holds the GIL, so it runs in worker processes while
+the event loop keeps serving cheap requests. The number of outstanding jobs
+is bounded; callers get HashingBusy instead of queueing without limit.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+from .config import get_settings
+from .metrics import password_hash_duration
+from .security import hash_password, hash_passwords, verify_and_update_password
+
+
+class HashingBusy(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("password hashing queue is full")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._pool = None
+        self._latencies = deque(maxlen=1024)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Created after the logging and threadpool threads exist; a forked child could
+            # inherit a lock one of them held, so workers start from a clean forkserver
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("forkserver")
+            )
+        return self._pool
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained"""
+        avg = sum(self._latencies) / len(self._latencies) if self._latencies else 1.0
+        return max(1, math.ceil(avg * self.pending / self.workers))
+
+    async def _run(self, fn, *args, items: int = 1):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HashingBusy(self.retry_after())
+        self.pending += 1
+        started = time.perf_counter()
+        pool = self._executor()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. the OOM killer took an argon2 job); the pool stays broken,
+            # so drop it for the next call to replace and let this one retry later
+            if self._pool is pool:
+                self.shutdown()
+            self.rejected += 1
+            raise HashingBusy(self.retry_after())
+        finally:
+            self.pending -= 1
+            elapsed = (time.perf_counter() - started) / items
+            self.completed += items
+            self._latencies.append(elapsed)
+            password_hash_duration.labels(fn.__name__).observe(elapsed)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def hash_many(self, passwords: list[str]) -> list[str]:
+        """Hash a batch split across every worker; all or nothing when the queue is full"""
+        size = max(1, math.ceil(len(passwords) / self.workers))
+        chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+        if self.pending + len(chunks) > self.max_pending:
+            self.rejected += 1
+            raise HashingBusy(self.retry_after())
+        results = await asyncio.gather(*(self._run(hash_passwords, chunk, items=len(chunk)) for chunk in chunks))
+        return [h for chunk in results for h in chunk]
+
+    async def verify(self, password: str, hashed: str) -> tuple[bool, str | None]:
+        """Returns (valid, new_hash); new_hash is set when the cost parameters have changed"""
+        return await self._run(verify_and_update_password, password, hashed)
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": min(self.pending, self.workers),
+            "queue_depth": max(0, self.pending - self.workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "latency_p50_ms": percentile(0.50),
+            "latency_p95_ms": percentile(0.95),
+            "latency_max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def _build_hasher() -> PasswordHasher:
+    s = get_settings()
+    workers = s.hash_workers or os.cpu_count() or 1
+    return PasswordHasher(workers=workers, max_pending=s.hash_max_pending or workers * 8)
+
+
+password_hasher = _build_hasher()
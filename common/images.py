@@ -0,0 +1,190 @@
+"""
+Resized image variants for uploads and profile photos.
+A fixed set of widths is generated in the background after each write and
+stored next to the original as <name>_w<width>.<format>. Other widths are
+rendered on demand into a size-bounded cache directory. Images are decoded
+only when their header dimensions fit IMAGE_MAX_PIXELS, and JPEGs are decoded
+at a reduced scale when that is still large enough for the widest variant.
+"""
+
+from collections import OrderedDict
+from PIL import Image, ImageOps
+import io
+import logging
+import os
+import tempfile
+import threading
+from .config import get_settings
+
+
+VARIANTS = {"thumb": 64, "small": 128, "medium": 256, "large": 512, "xlarge": 1024}
+WIDTHS = sorted(VARIANTS.values())
+MIN_WIDTH = 16
+MAX_WIDTH = 2048
+# A precomputed variant this much wider than requested is still served as-is
+SNAP_TOLERANCE = 1.25
+
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def variant_path(original: str, width: int, fmt: str) -> str:
+    stem = os.path.splitext(original)[0]
+    return f"{stem}_w{width}.{fmt}"
+
+
+def within_pixel_budget(source) -> bool:
+    """Whether an image's header dimensions fit IMAGE_MAX_PIXELS; data Pillow cannot read passes"""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    try:
+        with Image.open(source) as probe:
+            return probe.width * probe.height <= _settings.image_max_pixels
+    except Image.DecompressionBombError:
+        return False
+    except OSError:
+        return True
+
+
+def _load(original: str, width: int) -> Image.Image:
+    """Decode an image at no less than width pixels on either side where the format allows"""
+    img = Image.open(original)
+    if img.width * img.height > _settings.image_max_pixels:
+        img.close()
+        raise Image.DecompressionBombError(f"{img.width}x{img.height} exceeds IMAGE_MAX_PIXELS")
+    # JPEG only: decode at 1/2, 1/4 or 1/8 scale instead of full size; either side may end up as the width
+    img.draft("RGB", (width, width))
+    # Bake the EXIF orientation into the pixels; EXIF itself is never written out
+    ImageOps.exif_transpose(img, in_place=True)
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+    return img
+
+
+def _save(img: Image.Image, fmt: str, dest: str):
+    """Write an image already resized to its variant width"""
+    pil_format, _, options = FORMATS[fmt]
+    if pil_format == "JPEG" and img.mode != "RGB":
+        img = img.convert("RGB")
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), prefix=".tmp-")
+    os.close(fd)
+    try:
+        img.save(tmp, pil_format, **options)
+        os.replace(tmp, dest)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def generate_variants(original: str):
+    """Write every precomputed variant that is narrower than the original"""
+    try:
+        img = _load(original, WIDTHS[-1])
+        # Widest first, shrinking the one image in place, so the full-size decode is never copied
+        for width in reversed(WIDTHS):
+            if width >= img.width:
+                continue
+            img.thumbnail((width, width * 10), Image.LANCZOS)
+            for fmt in FORMATS:
+                dest = variant_path(original, width, fmt)
+                if not os.path.exists(dest):
+                    _save(img, fmt, dest)
+    except Exception as e:
+        logging.error("Failed to generate image variants for %s: %s", original, e)
+
+
+class VariantCache:
+    """On-disk LRU of rendered variants, bounded by total bytes"""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _index(self) -> OrderedDict:
+        if self._entries is None:
+            os.makedirs(self.root, exist_ok=True)
+            entries = OrderedDict()
+            paths = [os.path.join(self.root, n) for n in os.listdir(self.root) if not n.startswith(".")]
+            for path in sorted(paths, key=os.path.getmtime):
+                entries[path] = os.path.getsize(path)
+            self._entries = entries
+            self.size = sum(entries.values())
+        return self._entries
+
+    def get_or_render(self, original: str, width: int, fmt: str) -> str:
+        path = variant_path(os.path.join(self.root, os.path.basename(original)), width, fmt)
+        with self._lock:
+            entries = self._index()
+            if path in entries:
+                entries.move_to_end(path)
+                return path
+        img = _load(original, width)
+        img.thumbnail((width, width * 10), Image.LANCZOS)
+        _save(img, fmt, path)
+        with self._lock:
+            entries = self._index()
+            if path not in entries:
+                entries[path] = os.path.getsize(path)
+                self.size += entries[path]
+            while self.size > self.max_bytes and len(entries) > 1:
+                evicted, size = entries.popitem(last=False)
+                self.size -= size
+                try:
+                    os.unlink(evicted)
+                except FileNotFoundError:
+                    pass
+        return path
+
+
+def resolve_image(original: str, width: int | None, variant: str | None, accept: str) -> tuple[str, str | None]:
+    """
+    Pick the file to serve for a request and return (path, media type).
+    The media type is None when the original itself should be served, which
+    includes files Pillow cannot read. Raises ValueError for an unknown variant name.
+    """
+    if variant is not None:
+        if variant not in VARIANTS:
+            raise ValueError("unknown_variant")
+        width = VARIANTS[variant]
+    if width is None:
+        return original, None
+
+    width = max(MIN_WIDTH, min(MAX_WIDTH, width))
+    fmt = "webp" if "image/webp" in accept else "jpeg"
+    media_type = FORMATS[fmt][1]
+
+    try:
+        with Image.open(original) as probe:
+            img_width, img_height = probe.size
+            # Orientations 5-8 are rotated by 90 degrees once transposed
+            if probe.getexif().get(0x0112, 1) >= 5:
+                img_width = img_height
+    except (OSError, Image.DecompressionBombError):
+        # Not an image Pillow can read (stored before uploads were sniffed), or far too large; serve it as it is
+        return original, None
+    # Stored before the pixel budget applied: too large to decode for a variant
+    if width >= img_width or img_width * img_height > _settings.image_max_pixels:
+        return original, None
+
+    snapped = next((w for w in WIDTHS if w >= width), None)
+    if snapped is not None and snapped <= width * SNAP_TOLERANCE and snapped < img_width:
+        path = variant_path(original, snapped, fmt)
+        if os.path.exists(path):
+            return path, media_type
+        # Background job has not caught up yet; render the exact variant it would have
+        width = snapped
+    try:
+        return variant_cache.get_or_render(original, width, fmt), media_type
+    except (OSError, Image.DecompressionBombError) as e:
+        # Readable headers but undecodable pixels, e.g. a truncated file
+        logging.warning("Failed to render %s at %dpx: %s", original, width, e)
+        return original, None
+
+
+_settings = get_settings()
+variant_cache = VariantCache(_settings.image_cache_dir, _settings.image_cache_max_bytes)
@@ -0,0 +1,51 @@
+"""
+Application startup/shutdown shared by the gateway and the per-service apps.
+All initialisation (engine, pool warmup, schema checks) happens here so the
+request path never has to, and /ready only reports ready once it is done.
+"""
+
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+import logging
+from . import db
+from .hashing import password_hasher
+from .otp import otp_store
+from .profile_cache import profile_cache
+from .search import search_index
+
+
+def create_lifespan(database: bool = True, auth: bool = False):
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.ready = False
+        if database:
+            await db.ensure_engine()
+            profile_cache.start_listener()
+            await search_index.start()
+        if auth:
+            otp_store.start_sweeper()
+        app.state.ready = True
+        logging.info("Startup complete, app is ready")
+        try:
+            yield
+        finally:
+            app.state.ready = False
+            if auth:
+                otp_store.stop_sweeper()
+                password_hasher.shutdown()
+            if database:
+                profile_cache.stop_listener()
+                await db.dispose_engine()
+
+    return lifespan
+
+
+readiness_router = APIRouter()
+
+
+@readiness_router.get("/ready")
+def ready(request: Request):
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse({"ready": False}, status_code=503)
+    return {"ready": True}
@@ -0,0 +1,142 @@
+"""
+Logging off the request path.
+Records are stamped with the current request id and put on a bounded queue;
+a QueueListener thread formats them as JSON and writes them out. When the
+queue is full, records are dropped and counted rather than blocking requests.
+"""
+
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import copy
+import logging
+import orjson
+import queue
+import random
+import sys
+import uuid
+from .config import get_settings
+
+
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has (plus uvicorn's ANSI copy of the message); anything else came in through extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "color_message"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records at the given levels, e.g. {logging.DEBUG: 0.1}"""
+
+    def __init__(self, rates: dict[int, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops instead of blocking and does only cheap work on the caller's thread"""
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # Resolve what cannot travel to another thread: args, the traceback and the context
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.request_id = request_id_var.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging():
+    """Route the root logger (and uvicorn's) through a background thread; safe to call more than once"""
+    global _listener
+    if _listener is not None:
+        return
+    s = get_settings()
+    output = logging.StreamHandler(sys.stdout)
+    if s.log_format == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=s.log_queue_size))
+    handler.addFilter(SamplingFilter({logging.DEBUG: s.log_sample_debug}))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(s.log_level.upper())
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        # uvicorn installs its own stdout handlers; send its records through the queue too
+        logger = logging.getLogger(name)
+        logger.handlers[:] = []
+        logger.propagate = True
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+class RequestIdMiddleware:
+    """Pure ASGI middleware: takes X-Request-ID from the client or makes one, and echoes it back"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
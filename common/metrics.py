@@ -0,0 +1,214 @@
+"""
+In-process metrics in Prometheus text format.
+Histograms are plain counters updated from the event loop (middleware,
+SQLAlchemy events under the async engine, the hashing pool's callbacks), so
+there is no locking; gauges are read from their sources at scrape time.
+"""
+
+from bisect import bisect_left
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from time import perf_counter
+
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+def _series(name: str, labels: str) -> str:
+    return f"{name}{{{labels}}}" if labels else name
+
+
+class HistogramFamily:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._children: dict[tuple, Histogram] = {}
+
+    def labels(self, *values) -> Histogram:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = Histogram(self.buckets)
+        return child
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, h in sorted(self._children.items()):
+            labels = _labels(self.labelnames, values)
+            sep = "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), h.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="{le}"}} {cumulative}')
+            lines.append(f"{_series(self.name + '_sum', labels)} {h.sum}")
+            lines.append(f"{_series(self.name + '_count', labels)} {h.count}")
+        return lines
+
+
+request_duration = HistogramFamily(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status"), REQUEST_BUCKETS
+)
+db_statement_duration = HistogramFamily(
+    "db_statement_duration_seconds", "Time spent executing SQL statements", ("operation",), DB_BUCKETS
+)
+db_checkout_wait = HistogramFamily(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", (), DB_BUCKETS
+)
+db_connection_held = HistogramFamily(
+    "db_pool_connection_held_seconds", "Time a connection stays checked out", (), REQUEST_BUCKETS
+)
+password_hash_duration = HistogramFamily(
+    "password_hash_duration_seconds", "argon2 time per password, queueing included", ("operation",), HASH_BUCKETS
+)
+FAMILIES = (request_duration, db_statement_duration, db_checkout_wait, db_connection_held, password_hash_duration)
+
+_engines = {}
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware; labels requests by route template so paths with ids do not explode cardinality"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        started = perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            request_duration.labels(
+                scope["method"], route.path if route is not None else "unmatched", status
+            ).observe(perf_counter() - started)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """The async engine's default pool, timing how long checkouts wait"""
+
+    def _do_get(self):
+        started = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_checkout_wait.labels().observe(perf_counter() - started)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    db_statement_duration.labels(operation).observe(perf_counter() - started)
+
+
+def _handle_error(context):
+    stack = context.connection.info.get("query_started") if context.connection is not None else None
+    if stack:
+        stack.pop()
+
+
+def _checkout(dbapi_connection, connection_record, connection_proxy):
+    connection_record.info["checked_out_at"] = perf_counter()
+
+
+def _checkin(dbapi_connection, connection_record):
+    started = connection_record.info.pop("checked_out_at", None)
+    if started is not None:
+        db_connection_held.labels().observe(perf_counter() - started)
+
+
+def instrument_engine(engine, name: str = "primary"):
+    """Attach statement and pool timing to an AsyncEngine"""
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+    event.listen(sync_engine.pool, "checkout", _checkout)
+    event.listen(sync_engine.pool, "checkin", _checkin)
+    _engines[name] = engine
+
+
+def _samples(kind: str, name: str, help: str, samples: list[tuple[str, float]]) -> list[str]:
+    return [f"# HELP {name} {help}", f"# TYPE {name} {kind}"] + [f"{_series(name, labels)} {value}" for labels, value in samples]
+
+
+def render() -> str:
+    from .hashing import password_hasher
+    from .profile_cache import profile_cache
+
+    lines = []
+    for family in FAMILIES:
+        lines.extend(family.render())
+
+    pools = [(f'engine="{name}"', e.sync_engine.pool) for name, e in _engines.items()]
+    pools = [(labels, pool) for labels, pool in pools if hasattr(pool, "checkedout")]
+    lines.extend(_samples("gauge", "db_pool_size", "Configured pool size", [(l, p.size()) for l, p in pools]))
+    lines.extend(_samples("gauge", "db_pool_checked_out", "Connections currently in use", [(l, p.checkedout()) for l, p in pools]))
+    lines.extend(_samples("gauge", "db_pool_checked_in", "Idle connections in the pool", [(l, p.checkedin()) for l, p in pools]))
+    lines.extend(_samples("gauge", "db_pool_overflow", "Connections beyond pool_size", [(l, max(0, p.overflow())) for l, p in pools]))
+
+    stats = password_hasher.stats()
+    lines.extend(_samples("gauge", "password_hash_in_flight", "Hash jobs running in workers", [("", stats["in_flight"])]))
+    lines.extend(_samples("gauge", "password_hash_queue_depth", "Hash jobs waiting for a worker", [("", stats["queue_depth"])]))
+    lines.extend(_samples("counter", "password_hash_rejected_total", "Hash jobs refused because the queue was full", [("", stats["rejected"])]))
+
+    stats = profile_cache.stats()
+    lines.extend(_samples("counter", "profile_cache_hits_total", "/user/me lookups served from the profile cache", [("", stats["hits"])]))
+    lines.extend(_samples("counter", "profile_cache_misses_total", "/user/me lookups that read the row", [("", stats["misses"])]))
+    lines.extend(_samples("counter", "profile_cache_stale_total", "Cached profiles found outdated by the version check", [("", stats["stale"])]))
+    lines.extend(_samples("gauge", "profile_cache_entries", "Profiles in the cache", [("", stats["entries"])]))
+    lines.extend(_samples("gauge", "profile_cache_bytes", "Estimated size of the cached profiles", [("", stats["bytes"])]))
+    lines.extend(_samples("gauge", "profile_cache_listening", "1 while the change listener is connected", [("", int(stats["listening"]))]))
+    return "\n".join(lines) + "\n"
+
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def metrics():
+    # Rendered on the event loop, which is the only writer
+    return PlainTextResponse(render(), media_type=CONTENT_TYPE)
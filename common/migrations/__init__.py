@@ -0,0 +1,82 @@
+"""
+Versioned schema migrations.
+Each m<NNNN>_<name>.py module in this package defines upgrade(conn) and is
+applied once, in order, and recorded in schema_migrations. When the schema
+is already current, startup costs a single primary-key lookup.
+"""
+
+from sqlalchemy import Column, Integer, String, TIMESTAMP, Table, inspect, select, text
+from sqlalchemy.exc import DBAPIError
+import importlib
+import logging
+import pkgutil
+from ..db import Base
+from .. import models  # noqa: F401 - registers every table on Base.metadata
+
+
+# Arbitrary constant shared by every worker so only one migrates at a time
+ADVISORY_LOCK_KEY = 7310582261
+
+schema_migrations = Table(
+    "schema_migrations",
+    Base.metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", TIMESTAMP, server_default=text("CURRENT_TIMESTAMP")),
+)
+
+
+def load_migrations() -> list:
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        if info.name.startswith("m") and info.name[1:5].isdigit():
+            module = importlib.import_module(f"{__name__}.{info.name}")
+            module.VERSION = int(info.name[1:5])
+            migrations.append(module)
+    return sorted(migrations, key=lambda m: m.VERSION)
+
+
+def has_column(conn, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def add_column_if_missing(conn, table: str, column: str, ddl_type: str):
+    if not has_column(conn, table, column):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _current_version(conn) -> int:
+    latest = select(schema_migrations.c.version).order_by(schema_migrations.c.version.desc()).limit(1)
+    return conn.execute(latest).scalar() or 0
+
+
+def schema_is_current(conn) -> bool:
+    """Fast startup check: one primary-key lookup, no locks"""
+    migrations = load_migrations()
+    try:
+        return _current_version(conn) == (migrations[-1].VERSION if migrations else 0)
+    except DBAPIError:
+        # schema_migrations does not exist yet
+        return False
+
+
+def run_migrations(conn):
+    """Bring the schema up to date; conn is a sync Connection inside a transaction"""
+    if conn.dialect.name == "postgresql":
+        # Released at commit; other workers block here, then find nothing left to do
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+
+    # Fresh databases get every table (schema_migrations included) straight from the models
+    Base.metadata.create_all(conn)
+    current = _current_version(conn)
+    for migration in load_migrations():
+        if migration.VERSION <= current:
+            continue
+        logging.info("Applying migration %d: %s", migration.VERSION, migration.__name__)
+        migration.upgrade(conn)
+        conn.execute(schema_migrations.insert().values(
+            version=migration.VERSION,
+            name=migration.__name__.rsplit(".", 1)[-1],
+        ))
+        current = migration.VERSION
+    logging.info("Database schema at version %d", current)
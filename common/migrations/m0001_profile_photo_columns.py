@@ -0,0 +1,8 @@
+"""Add the base64 profile photo columns to user_profiles"""
+
+from . import add_column_if_missing
+
+
+def upgrade(conn):
+    add_column_if_missing(conn, "user_profiles", "profile_photo_data", "TEXT")
+    add_column_if_missing(conn, "user_profiles", "profile_photo_mime_type", "VARCHAR(50)")
@@ -0,0 +1,7 @@
+"""Reference profile photos in the blob store by SHA-256"""
+
+from . import add_column_if_missing
+
+
+def upgrade(conn):
+    add_column_if_missing(conn, "user_profiles", "profile_photo_hash", "VARCHAR(64)")
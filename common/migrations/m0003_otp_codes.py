@@ -0,0 +1,7 @@
+"""Shared OTP table for OTP_BACKEND=postgres"""
+
+from ..models import OtpCode
+
+
+def upgrade(conn):
+    OtpCode.__table__.create(conn, checkfirst=True)
@@ -0,0 +1,22 @@
+"""Indexed geohash column for nearby-vendor queries, backfilled from latitude/longitude"""
+
+from sqlalchemy import inspect, text
+from . import add_column_if_missing
+from .. import geo
+
+
+def upgrade(conn):
+    collate = ' COLLATE "C"' if conn.dialect.name == "postgresql" else ""
+    add_column_if_missing(conn, "user_profiles", "geohash", f"VARCHAR(12){collate}")
+    if not any(ix["name"] == "ix_user_profiles_geohash" for ix in inspect(conn).get_indexes("user_profiles")):
+        conn.execute(text("CREATE INDEX ix_user_profiles_geohash ON user_profiles (geohash)"))
+
+    rows = conn.execute(text(
+        "SELECT id, latitude, longitude FROM user_profiles "
+        "WHERE geohash IS NULL AND latitude IS NOT NULL AND longitude IS NOT NULL"
+    )).fetchall()
+    if rows:
+        conn.execute(
+            text("UPDATE user_profiles SET geohash = :geohash WHERE id = :id"),
+            [{"id": row.id, "geohash": geo.encode(float(row.latitude), float(row.longitude))} for row in rows],
+        )
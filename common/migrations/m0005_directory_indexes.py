@@ -0,0 +1,16 @@
+"""Composite indexes behind keyset pagination in /user/directory"""
+
+from ..models import UserProfile
+
+
+DIRECTORY_INDEXES = {
+    "ix_user_profiles_directory",
+    "ix_user_profiles_directory_city",
+    "ix_user_profiles_directory_state",
+}
+
+
+def upgrade(conn):
+    for index in UserProfile.__table__.indexes:
+        if index.name in DIRECTORY_INDEXES:
+            index.create(conn, checkfirst=True)
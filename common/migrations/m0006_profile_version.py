@@ -0,0 +1,7 @@
+"""Row version counter behind the /user/me ETag"""
+
+from . import add_column_if_missing
+
+
+def upgrade(conn):
+    add_column_if_missing(conn, "user_profiles", "version", "INTEGER NOT NULL DEFAULT 1")
@@ -0,0 +1,27 @@
+"""Trigger that NOTIFYs profile_changed with the user id, so workers can drop cached profiles"""
+
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    if conn.dialect.name != "postgresql":
+        # Nothing to listen with; the profile cache checks the version column instead
+        return
+    conn.execute(text("""
+        CREATE OR REPLACE FUNCTION notify_profile_changed() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                PERFORM pg_notify('profile_changed', OLD.id::text);
+            ELSE
+                PERFORM pg_notify('profile_changed', NEW.id::text);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """))
+    conn.execute(text("DROP TRIGGER IF EXISTS user_profiles_notify_changed ON user_profiles"))
+    conn.execute(text("""
+        CREATE TRIGGER user_profiles_notify_changed
+        AFTER UPDATE OR DELETE ON user_profiles
+        FOR EACH ROW EXECUTE FUNCTION notify_profile_changed()
+    """))
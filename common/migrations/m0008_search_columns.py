@@ -0,0 +1,44 @@
+"""Normalized search columns for /user/search, backfilled, plus pg_trgm indexes on Postgres"""
+
+from sqlalchemy import text
+from . import add_column_if_missing
+from ..models import UserProfile
+from ..text import normalize
+
+
+SEARCH_INDEXES = {"ix_user_profiles_search_name", "ix_user_profiles_search_city"}
+
+
+def upgrade(conn):
+    postgres = conn.dialect.name == "postgresql"
+    collate = ' COLLATE "C"' if postgres else ""
+    add_column_if_missing(conn, "user_profiles", "search_name", f"VARCHAR(255){collate}")
+    add_column_if_missing(conn, "user_profiles", "search_city", f"VARCHAR(100){collate}")
+    for index in UserProfile.__table__.indexes:
+        if index.name in SEARCH_INDEXES:
+            index.create(conn, checkfirst=True)
+
+    rows = conn.execute(text(
+        "SELECT id, full_name, city FROM user_profiles WHERE search_name IS NULL"
+    )).fetchall()
+    if rows:
+        conn.execute(
+            text("UPDATE user_profiles SET search_name = :search_name, search_city = :search_city WHERE id = :id"),
+            [{"id": row.id, "search_name": normalize(row.full_name), "search_city": normalize(row.city, 100)} for row in rows],
+        )
+
+    if postgres:
+        # Typo-tolerant matching (word_similarity) and infix LIKE; pincode gets a prefix index of its own
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_user_profiles_search_name_trgm "
+            "ON user_profiles USING gin (search_name gin_trgm_ops)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_user_profiles_search_city_trgm "
+            "ON user_profiles USING gin (search_city gin_trgm_ops)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_user_profiles_pincode_prefix "
+            "ON user_profiles (pincode text_pattern_ops)"
+        ))
@@ -1,15 +1,29 @@
-from sqlalchemy import Column, String, Text, TIMESTAMP, Numeric, text
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, Index, Integer, String, Text, TIMESTAMP, Numeric, Float, Uuid, func, text
+from sqlalchemy.dialects.sqlite import DATETIME
+from sqlalchemy.orm import deferred
 from .db import Base
+from . import geo
+from .text import normalize
 import base64
+import uuid
+
+
+# SQLite's CURRENT_TIMESTAMP stores whole seconds as text, while bound datetimes default to
+# "...HH:MM:SS.ffffff"; values compared against server-set ones (the directory cursor) must match
+Timestamp = TIMESTAMP().with_variant(
+    DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"), "sqlite"
+)
 
 
 class UserProfile(Base):
     __tablename__ = "user_profiles"
-    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
+    # Portable column types and defaults so the schema also builds on SQLite (benchmarks, local dev);
+    # on Postgres Uuid is the native UUID type
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
     full_name = Column(String(255), nullable=False)
     mobile_no = Column(String(20), nullable=False, unique=True)
-    password = Column(Text, nullable=False)
+    # Only login needs the hash; it selects it explicitly
+    password = deferred(Column(Text, nullable=False))
     gender = Column(String(20))
     category = Column(String(50), nullable=False)
     address_line = Column(Text)
@@ -19,20 +33,58 @@ class UserProfile(Base):
     pincode = Column(String(20))
     latitude = Column(Numeric(10, 7))
     longitude = Column(Numeric(10, 7))
+    # Byte-wise collation so geohash prefix ranges map onto the btree index
+    geohash = Column(String(12).with_variant(String(12, collation="C"), "postgresql"), index=True)
     profile_photo_url = Column(Text)
-    profile_photo_data = Column(Text)  # Base64 encoded image data
+    profile_photo_hash = Column(String(64))  # SHA-256 of the photo in the blob store
+    profile_photo_data = deferred(Column(Text))  # Legacy base64 image data, superseded by profile_photo_hash
     profile_photo_mime_type = Column(String(50))  # e.g., 'image/jpeg', 'image/png'
-    created_at = Column(TIMESTAMP, server_default=text("NOW()"))
-    updated_at = Column(TIMESTAMP, server_default=text("NOW()"))
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, server_default=func.now(), onupdate=func.now())
+    # normalize()d full_name and city for /user/search; byte-wise collation so prefix LIKE uses the btree index
+    search_name = Column(String(255).with_variant(String(255, collation="C"), "postgresql"), index=True)
+    search_city = Column(String(100).with_variant(String(100, collation="C"), "postgresql"), index=True)
+    # Bumped in the same UPDATE as any change to the row; backs the /user/me ETag
+    version = Column(Integer, nullable=False, server_default=text("1"), onupdate=text("version + 1"))
+
+    __table_args__ = (
+        # Keyset pagination for /user/directory: equality filters, then (created_at, id)
+        Index("ix_user_profiles_directory", "category", "created_at", "id"),
+        Index("ix_user_profiles_directory_city", "category", "city", "created_at", "id"),
+        Index("ix_user_profiles_directory_state", "category", "state", "created_at", "id"),
+    )
+
+    def set_location(self, latitude: float | None, longitude: float | None):
+        """Set coordinates and keep the geohash index column in sync"""
+        self.latitude = latitude
+        self.longitude = longitude
+        if latitude is not None and longitude is not None:
+            self.geohash = geo.encode(float(latitude), float(longitude))
+        else:
+            self.geohash = None
 
-    def set_profile_photo(self, image_data: bytes, mime_type: str):
-        """Store profile photo as base64 in database"""
-        self.profile_photo_data = base64.b64encode(image_data).decode('utf-8')
+    def set_search_columns(self):
+        """Keep the search columns in sync with full_name and city"""
+        self.search_name = normalize(self.full_name)
+        self.search_city = normalize(self.city, 100)
+
+    def set_profile_photo(self, photo_hash: str, mime_type: str):
+        """Point the profile at a photo already written to the blob store"""
+        self.profile_photo_hash = photo_hash
         self.profile_photo_mime_type = mime_type
-        self.profile_photo_url = f"data:{mime_type};base64,{self.profile_photo_data}"
+        self.profile_photo_url = f"/user/photo/{photo_hash}"
+        self.profile_photo_data = None
 
     def get_profile_photo_data(self) -> bytes:
-        """Get profile photo data as bytes"""
+        """Get legacy base64 profile photo data as bytes"""
         if self.profile_photo_data:
             return base64.b64decode(self.profile_photo_data)
         return None
+
+
+class OtpCode(Base):
+    """Pending OTPs, shared by every worker when OTP_BACKEND=postgres"""
+    __tablename__ = "otp_codes"
+    mobile_no = Column(String(20), primary_key=True)
+    code = Column(String(10), nullable=False)
+    expires_at = Column(Float, nullable=False, index=True)  # Unix timestamp
@@ -0,0 +1,141 @@
+"""
+One-time password storage.
+MemoryOtpStore keeps codes in the current process and only works with a
+single worker; PostgresOtpStore keeps them in the otp_codes table so any
+worker can verify a code sent by another. Both evict expired codes from a
+background sweeper.
+"""
+
+from abc import ABC, abstractmethod
+from sqlalchemy import select, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from time import time
+import asyncio
+import heapq
+import logging
+from .config import get_settings
+from . import db
+from .models import OtpCode
+
+
+# Both dialects spell the upsert as INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_INSERT = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+class OtpStore(ABC):
+    def __init__(self, sweep_interval: float):
+        self.sweep_interval = sweep_interval
+        self._sweeper = None
+
+    @abstractmethod
+    async def put(self, mobile_no: str, code: str, ttl_seconds: int):
+        ...
+
+    @abstractmethod
+    async def get(self, mobile_no: str) -> tuple[str, float] | None:
+        """Return (code, expiry timestamp); expired codes may still be returned until swept"""
+
+    @abstractmethod
+    async def delete(self, mobile_no: str):
+        ...
+
+    @abstractmethod
+    async def sweep(self) -> int:
+        """Remove expired codes and return how many were removed"""
+
+    def start_sweeper(self):
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_forever())
+
+    def stop_sweeper(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                removed = await self.sweep()
+                if removed:
+                    logging.info("Swept %d expired OTPs", removed)
+            except Exception as e:
+                logging.error("OTP sweep failed: %s", e)
+
+
+class MemoryOtpStore(OtpStore):
+    def __init__(self, sweep_interval: float):
+        super().__init__(sweep_interval)
+        self._codes: dict[str, tuple[str, float]] = {}
+        # (expiry, mobile_no) min-heap so a sweep only touches expired entries
+        self._expiries: list[tuple[float, str]] = []
+
+    async def put(self, mobile_no: str, code: str, ttl_seconds: int):
+        self.start_sweeper()
+        expiry = time() + ttl_seconds
+        self._codes[mobile_no] = (code, expiry)
+        heapq.heappush(self._expiries, (expiry, mobile_no))
+
+    async def get(self, mobile_no: str) -> tuple[str, float] | None:
+        return self._codes.get(mobile_no)
+
+    async def delete(self, mobile_no: str):
+        self._codes.pop(mobile_no, None)
+
+    async def sweep(self) -> int:
+        now = time()
+        removed = 0
+        while self._expiries and self._expiries[0][0] <= now:
+            expiry, mobile_no = heapq.heappop(self._expiries)
+            stored = self._codes.get(mobile_no)
+            # A newer code for the same number has its own heap entry
+            if stored is not None and stored[1] == expiry:
+                del self._codes[mobile_no]
+                removed += 1
+        return removed
+
+
+class PostgresOtpStore(OtpStore):
+    async def put(self, mobile_no: str, code: str, ttl_seconds: int):
+        self.start_sweeper()
+        expiry = time() + ttl_seconds
+        insert = _UPSERT_INSERT[db.Engine.dialect.name]
+        stmt = insert(OtpCode).values(mobile_no=mobile_no, code=code, expires_at=expiry)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[OtpCode.mobile_no],
+            set_={"code": code, "expires_at": expiry},
+        )
+        async with db.SessionLocal() as session:
+            await session.execute(stmt)
+            await session.commit()
+
+    async def get(self, mobile_no: str) -> tuple[str, float] | None:
+        async with db.SessionLocal() as session:
+            result = await session.execute(
+                select(OtpCode.code, OtpCode.expires_at).where(OtpCode.mobile_no == mobile_no)
+            )
+            row = result.first()
+        return (row.code, row.expires_at) if row else None
+
+    async def delete(self, mobile_no: str):
+        async with db.SessionLocal() as session:
+            await session.execute(delete(OtpCode).where(OtpCode.mobile_no == mobile_no))
+            await session.commit()
+
+    async def sweep(self) -> int:
+        async with db.SessionLocal() as session:
+            result = await session.execute(delete(OtpCode).where(OtpCode.expires_at <= time()))
+            await session.commit()
+        return result.rowcount
+
+
+def _build_otp_store() -> OtpStore:
+    s = get_settings()
+    if s.otp_backend == "postgres":
+        return PostgresOtpStore(s.otp_sweep_interval_seconds)
+    if s.otp_backend == "memory":
+        return MemoryOtpStore(s.otp_sweep_interval_seconds)
+    raise RuntimeError(f"Unknown OTP_BACKEND: {s.otp_backend}")
+
+
+otp_store = _build_otp_store()
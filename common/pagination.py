@@ -0,0 +1,25 @@
+"""
+Opaque keyset-pagination cursors.
+A cursor is the sort key of the last row on a page, JSON encoded and made
+URL safe; the next page starts strictly after it.
+"""
+
+import base64
+import json
+
+
+def encode_cursor(key: list) -> str:
+    raw = json.dumps(key, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """Raises ValueError for anything that is not a cursor we issued"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except Exception:
+        raise ValueError("invalid_cursor")
+    if not isinstance(key, list):
+        raise ValueError("invalid_cursor")
+    return key
@@ -0,0 +1,218 @@
+"""
+In-process read-through cache of profiles for /user/me.
+Entries are keyed by user id and hold every ProfileResponse field plus the
+row version; the cache is an LRU bounded by total bytes and by a TTL.
+
+Other workers learn about changes through Postgres LISTEN/NOTIFY: a trigger
+on user_profiles (migration 0007) notifies on every UPDATE and DELETE, and
+a listener task drops the entry. A connection pooler accepts LISTEN but never
+delivers notifications, so the feed is only trusted when it comes from
+PROFILE_CACHE_LISTEN_URL, a direct connection. Otherwise (no such URL,
+SQLite, PROFILE_CACHE_NOTIFY=false, or the connection dropped) a hit is
+confirmed against the version column, which still skips reading the row.
+A miss does what the uncached endpoint did: If-None-Match is checked
+against the version column first, and only the requested columns are read.
+The same notifications route a changed user's reads to the primary for a
+moment when a read replica is configured (see db.mark_written). Only the
+event loop touches the cache, so there is no locking.
+"""
+
+from collections import OrderedDict
+from sqlalchemy import select
+from time import monotonic
+import asyncio
+import logging
+import orjson
+import psycopg
+import uuid
+from urllib.parse import urlsplit
+from .config import get_settings
+from . import db
+from .models import UserProfile
+from .schemas import PROFILE_FIELDS, dump_profile
+
+
+# Sent by the trigger from migration 0007
+CHANNEL = "profile_changed"
+# Rough per-entry cost of the key, tuple and dict on top of the profile's JSON size
+ENTRY_OVERHEAD_BYTES = 256
+# A quiet LISTEN connection is pinged this often so a dead one is noticed
+KEEPALIVE_SECONDS = 30
+RECONNECT_SECONDS = 5
+
+
+class ProfileCache:
+    def __init__(self, max_bytes: int, ttl_seconds: int):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.bytes = 0
+        # Bumped by every invalidation; a miss only fills the cache if nothing was invalidated while it read
+        self.generation = 0
+        self.listening = False
+        # Whether the listener's connection is known to deliver notifications (see start_listener)
+        self.trust_notify = False
+        self._entries: OrderedDict = OrderedDict()
+        self._listener = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, uid: uuid.UUID) -> tuple[int, dict] | None:
+        entry = self._entries.get(uid)
+        if entry is None:
+            return None
+        version, profile, size, expires_at = entry
+        if expires_at <= monotonic():
+            self._drop(uid)
+            return None
+        self._entries.move_to_end(uid)
+        return version, profile
+
+    def put(self, uid: uuid.UUID, version: int, profile: dict, generation: int):
+        if generation != self.generation or not self.max_bytes:
+            return
+        size = len(orjson.dumps(profile)) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        self._drop(uid)
+        self._entries[uid] = (version, profile, size, monotonic() + self.ttl_seconds)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, _, evicted, _) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+
+    def invalidate(self, uid: uuid.UUID):
+        self.generation += 1
+        self._drop(uid)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+        self.bytes = 0
+
+    def _drop(self, uid: uuid.UUID):
+        entry = self._entries.pop(uid, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    async def load(
+        self, session, uid: uuid.UUID, fields: tuple[str, ...] = PROFILE_FIELDS, unchanged=None
+    ) -> tuple[int, dict | None] | None:
+        """
+        (version, profile with at least fields) for uid, or None if there is no such user.
+        On a miss, unchanged(version) is asked first with the version column alone; if it
+        says the client's copy is current the row is not read and the profile is None.
+        A miss reads only the requested columns and is cached only if that is every field.
+        """
+        version = None
+        cached = self.get(uid)
+        if cached is not None:
+            if self.listening and self.trust_notify:
+                self.hits += 1
+                return cached
+            # No reliable change feed: confirm the entry with the version column alone
+            version = await self._version(session, uid)
+            if version == cached[0]:
+                self.hits += 1
+                return cached
+            self.stale += 1
+            self.invalidate(uid)
+            if version is None:
+                return None
+        self.misses += 1
+
+        if unchanged is not None:
+            if version is None:
+                version = await self._version(session, uid)
+                if version is None:
+                    return None
+            if unchanged(version):
+                return version, None
+
+        generation = self.generation
+        columns = [getattr(UserProfile, name) for name in fields]
+        row = (await session.execute(select(UserProfile.version, *columns).where(UserProfile.id == uid))).first()
+        if not row:
+            return None
+        profile = dump_profile(row, fields)
+        # fields is deduplicated, so the same length means every field
+        if len(fields) == len(PROFILE_FIELDS):
+            self.put(uid, row.version, profile, generation)
+        return row.version, profile
+
+    async def _version(self, session, uid: uuid.UUID) -> int | None:
+        return (await session.execute(select(UserProfile.version).where(UserProfile.id == uid))).scalar()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "listening": self.listening,
+            "trust_notify": self.trust_notify,
+        }
+
+    def start_listener(self):
+        """Follow profile changes made by other workers; a no-op unless the database is Postgres"""
+        s = get_settings()
+        # With a replica the feed also tells this worker whose reads must go to the primary
+        if not (self.max_bytes or db.ReadEngine is not None) or not s.profile_cache_notify or db.Engine is None:
+            return
+        if db.Engine.dialect.name != "postgresql":
+            return
+        listen_url = s.profile_cache_listen_url
+        # Neon names its pooled endpoints <endpoint>-pooler.<region>...
+        if listen_url and "-pooler" in (urlsplit(listen_url).hostname or ""):
+            logging.warning("PROFILE_CACHE_LISTEN_URL is a pooled endpoint; profile cache hits stay version-checked")
+            listen_url = ""
+        self.trust_notify = bool(listen_url)
+        if self._listener is None or self._listener.done():
+            # Even untrusted, a feed that does arrive still drops entries and routes reads early
+            conninfo = listen_url or s.database_url
+            self._listener = asyncio.get_running_loop().create_task(self._listen_forever(conninfo))
+
+    def stop_listener(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        self.listening = False
+
+    async def _listen_forever(self, conninfo: str):
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {CHANNEL}")
+                    # Changes made while nobody was listening are unknown; start over
+                    self.clear()
+                    self.listening = True
+                    logging.info("Profile cache listening for changes")
+                    while True:
+                        async for notify in conn.notifies(timeout=KEEPALIVE_SECONDS):
+                            self._on_notify(notify.payload)
+                        await conn.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning("Profile cache listener disconnected: %s", e)
+            finally:
+                self.listening = False
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+    def _on_notify(self, payload: str):
+        try:
+            uid = uuid.UUID(payload)
+            self.invalidate(uid)
+            # Written on another worker; this one reads it from the primary until the replica catches up
+            db.mark_written(uid)
+        except ValueError:
+            # Not ours; drop everything rather than risk serving a stale profile
+            self.clear()
+
+
+_settings = get_settings()
+profile_cache = ProfileCache(_settings.profile_cache_max_bytes, _settings.profile_cache_ttl_seconds)
@@ -0,0 +1,242 @@
+"""
+Admission control for the gateway.
+Requests to rate-limited routes spend a token from per-client buckets (by IP
+and by a JSON body field such as mobile_no) and get a 429 when one is empty;
+a form body is not read here, so its handler spends those tokens through
+limit_fields once it has parsed the form. Every request also needs one of a
+fixed number of concurrency slots and gets a 503 when none is free. Both
+checks run before routing, so rejected requests never reach the database or
+the hashing pool.
+"""
+
+from collections import OrderedDict
+from fastapi import HTTPException, Request
+from starlette.responses import JSONResponse
+from time import monotonic, time
+import anyio
+import json
+import math
+import sqlite3
+import threading
+from .config import get_settings
+
+
+# Bodies larger than this are not parsed for keys (they still pass through untouched)
+MAX_KEY_BODY_BYTES = 16 * 1024
+# Paths that must answer even when the app is saturated
+UNLIMITED_PATHS = ("/ready", "/metrics")
+# Bodies of these types are streamed by their handlers, which call limit_fields instead
+FORM_CONTENT_TYPES = (b"multipart/form-data", b"application/x-www-form-urlencoded")
+
+
+def parse_rate(rate: str) -> tuple[float, float]:
+    """'10/60' -> (capacity 10, refill 10/60 tokens per second)"""
+    count, seconds = rate.split("/")
+    return float(count), float(count) / float(seconds)
+
+
+def _refill(tokens: float, updated: float, capacity: float, per_second: float, now: float) -> tuple[float, float]:
+    """Returns (tokens left, seconds to wait); wait is 0 when a token was taken"""
+    tokens = min(capacity, tokens + (now - updated) * per_second)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / per_second
+
+
+class MemoryBuckets:
+    """Token buckets for this process, evicting the least recently used key past max_keys"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict = OrderedDict()
+
+    async def take(self, key: str, capacity: float, per_second: float) -> float:
+        now = monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens, wait = _refill(tokens, updated, capacity, per_second, now)
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class SqliteBuckets:
+    """Token buckets in a local SQLite file, shared by every worker on the host"""
+
+    # Rows idle this long are full again anyway and can be dropped
+    IDLE_SECONDS = 3600
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, timeout=1.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._ops = 0
+
+    def _take(self, key: str, capacity: float, per_second: float) -> float:
+        now = time()  # wall clock, comparable across processes
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens, wait = _refill(*(row or (capacity, now)), capacity, per_second, now)
+                self._conn.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (key, tokens, now))
+                self._ops += 1
+                if self._ops % self.PRUNE_EVERY == 0:
+                    self._conn.execute("DELETE FROM buckets WHERE updated < ?", (now - self.IDLE_SECONDS,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    async def take(self, key: str, capacity: float, per_second: float) -> float:
+        return await anyio.to_thread.run_sync(self._take, key, capacity, per_second)
+
+
+def _client_ip(scope, trusted_hops: int) -> str:
+    """
+    The address the outermost of trusted_hops proxies saw: each proxy appends its
+    peer to X-Forwarded-For, so entries left of that one are whatever the client sent.
+    """
+    if trusted_hops:
+        forwarded = [
+            ip.strip()
+            for name, value in scope["headers"]
+            if name == b"x-forwarded-for"
+            for ip in value.decode("latin-1").split(",")
+        ]
+        if len(forwarded) >= trusted_hops:
+            return forwarded[-trusted_hops]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _content_type(scope) -> bytes:
+    for name, value in scope["headers"]:
+        if name == b"content-type":
+            return value.split(b";")[0].strip().lower()
+    return b""
+
+
+async def limit_fields(request: Request, fields: dict):
+    """Spend the route's body-field tokens for a form body the middleware left unread; 429 when one is empty"""
+    take = request.scope.get("state", {}).get("rate_limit_fields")
+    if take is None:
+        return
+    wait = await take(fields)
+    if wait:
+        raise HTTPException(status_code=429, detail="rate_limited", headers={"Retry-After": str(math.ceil(wait))})
+
+
+async def _read_body(receive) -> tuple[bytes, list]:
+    """Drain the request body, keeping the messages so they can be replayed to the app"""
+    messages = []
+    body = b""
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            break
+    return body, messages
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware: per-route token buckets, then a global concurrency limit"""
+
+    def __init__(self, app):
+        s = get_settings()
+        self.app = app
+        self.trusted_hops = s.rate_limit_trusted_hops
+        self.rules = {
+            route: {key: parse_rate(rate) for key, rate in limits.items()}
+            for route, limits in s.rate_limits.items()
+        }
+        if s.rate_limit_backend == "sqlite":
+            self.buckets = SqliteBuckets(s.rate_limit_sqlite_path)
+        elif s.rate_limit_backend == "memory":
+            self.buckets = MemoryBuckets(s.rate_limit_max_keys)
+        else:
+            raise RuntimeError(f"Unknown RATE_LIMIT_BACKEND: {s.rate_limit_backend}")
+        self.max_concurrent = s.max_concurrent_requests
+        self.in_flight = 0
+        self.rejected = 0
+        self.shed = 0
+
+    async def _rate_limited(self, scope, receive, rule: dict):
+        """Returns (retry_after or None, receive to pass on)"""
+        route = f'{scope["method"]} {scope["path"]}'
+        for key, (capacity, per_second) in rule.items():
+            if key != "ip":
+                continue
+            wait = await self.buckets.take(f"{route}|ip|{_client_ip(scope, self.trusted_hops)}", capacity, per_second)
+            if wait:
+                return wait, receive
+
+        body_keys = [key for key in rule if key != "ip"]
+        if not body_keys:
+            return None, receive
+
+        async def take_fields(fields: dict) -> float:
+            for key in body_keys:
+                value = fields.get(key)
+                if value is None:
+                    continue
+                capacity, per_second = rule[key]
+                wait = await self.buckets.take(f"{route}|{key}|{value}", capacity, per_second)
+                if wait:
+                    return wait
+            return 0.0
+
+        if _content_type(scope) in FORM_CONTENT_TYPES:
+            # Draining an upload here would hold it all in memory; the handler parses it and calls limit_fields
+            scope.setdefault("state", {})["rate_limit_fields"] = take_fields
+            return None, receive
+        body, messages = await _read_body(receive)
+        replay = iter(messages)
+
+        async def replay_receive():
+            return next(replay, None) or await receive()
+
+        try:
+            fields = json.loads(body) if len(body) <= MAX_KEY_BODY_BYTES else {}
+        except ValueError:
+            fields = {}
+        if not isinstance(fields, dict):
+            fields = {}
+        return await take_fields(fields) or None, replay_receive
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in UNLIMITED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        rule = self.rules.get(f'{scope["method"]} {scope["path"]}')
+        if rule:
+            wait, receive = await self._rate_limited(scope, receive, rule)
+            if wait:
+                self.rejected += 1
+                response = JSONResponse(
+                    {"detail": "rate_limited"}, status_code=429, headers={"Retry-After": str(math.ceil(wait))}
+                )
+                await response(scope, receive, send)
+                return
+
+        if self.max_concurrent and self.in_flight >= self.max_concurrent:
+            self.shed += 1
+            response = JSONResponse({"detail": "server_busy"}, status_code=503, headers={"Retry-After": "1"})
+            await response(scope, receive, send)
+            return
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,145 @@
+"""
+Schemas shared by the profile endpoints.
+ProfileResponse documents the shape; dump_profile builds the same dict
+straight from an ORM object or a row, skipping pydantic validation, so it can
+go to ORJSONResponse as-is. PUBLIC_PROFILE_COLUMNS and dump_public_profile
+are the narrower card other users see. The multipart helpers let a JSON request model
+double as the text parts of a form that carries a raw file.
+"""
+
+from decimal import Decimal
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from typing import Optional
+import base64
+import binascii
+import hashlib
+import uuid
+from .images import within_pixel_budget
+from .models import UserProfile
+
+
+class ProfileResponse(BaseModel):
+    id: uuid.UUID
+    full_name: str
+    mobile_no: str
+    gender: Optional[str] = None
+    category: str
+    address_line: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    country: Optional[str] = None
+    pincode: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    profile_photo_url: Optional[str] = None
+    profile_photo_hash: Optional[str] = None
+    profile_photo_mime_type: Optional[str] = None
+
+
+PROFILE_FIELDS = tuple(ProfileResponse.model_fields)
+
+
+def parse_fields(fields: str | None) -> tuple[str, ...]:
+    """Validate a comma-separated ?fields= list; empty means every field"""
+    if not fields:
+        return PROFILE_FIELDS
+    requested = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in ProfileResponse.model_fields]
+    if unknown or not requested:
+        raise ValueError(f"unknown_fields: {','.join(unknown)}")
+    return requested
+
+
+def dump_profile(source, fields: tuple[str, ...] = PROFILE_FIELDS) -> dict:
+    """Profile dict ready for orjson; Numeric columns come back as Decimal"""
+    out = {}
+    for name in fields:
+        value = getattr(source, name)
+        out[name] = float(value) if isinstance(value, Decimal) else value
+    return out
+
+
+# What a signed-in user may see of someone else's profile (/user/directory, /user/batch, /user/search)
+PUBLIC_PROFILE_COLUMNS = (
+    UserProfile.id,
+    UserProfile.full_name,
+    UserProfile.category,
+    UserProfile.city,
+    UserProfile.state,
+    UserProfile.profile_photo_url,
+)
+
+
+def dump_public_profile(row) -> dict:
+    """Public card from a row selected with PUBLIC_PROFILE_COLUMNS, or from a UserProfile"""
+    return {
+        "id": str(row.id),
+        "full_name": row.full_name,
+        "category": row.category,
+        "city": row.city,
+        "state": row.state,
+        "profile_photo_url": row.profile_photo_url,
+    }
+
+
+def profile_etag(uid, version: int, fields: tuple[str, ...] = PROFILE_FIELDS) -> str:
+    """Strong ETag for one user's profile at a given row version and field selection"""
+    digest = hashlib.sha256(f"{uid}:{version}:{','.join(fields)}".encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+# Base64 photo fields of the JSON bodies; the multipart variants send the photo as a raw "photo" part
+PHOTO_JSON_FIELDS = {"profile_photo_data", "profile_photo_mime_type"}
+# Room for the text parts of a form on top of its file
+FORM_FIELDS_MAX_BYTES = 64 * 1024
+
+
+def check_form_size(request: Request, max_bytes: int):
+    """Refuse a body whose Content-Length is already over max_bytes, before reading any of it"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise HTTPException(status_code=413, detail="file_too_large")
+
+
+def decode_photo_data(data: str) -> bytes:
+    """Raw bytes of a base64 profile_photo_data (line breaks allowed); anything else is a 400"""
+    try:
+        return base64.b64decode("".join(data.split()), validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="invalid_photo_data")
+
+
+def require_image(mime_type: str | None) -> str:
+    """The sniffed mime type of a photo; anything that is not an image is refused before it is stored"""
+    if mime_type is None:
+        raise HTTPException(status_code=415, detail="unsupported_file_type")
+    return mime_type
+
+
+def require_pixels(image) -> None:
+    """Refuse an image (bytes or a path) whose header promises more than IMAGE_MAX_PIXELS, before anything decodes it"""
+    if not within_pixel_budget(image):
+        raise HTTPException(status_code=413, detail="image_too_large")
+
+
+def multipart_request_body(model: type[BaseModel], file_field: str, exclude: set[str]) -> dict:
+    """OpenAPI requestBody for a form with model's fields as text parts plus one binary file part"""
+    schema = model.model_json_schema()
+    properties = {k: v for k, v in schema["properties"].items() if k not in exclude}
+    properties[file_field] = {"type": "string", "format": "binary"}
+    required = [k for k in schema.get("required", []) if k not in exclude]
+    return {
+        "content": {"multipart/form-data": {"schema": {"type": "object", "properties": properties, "required": required}}},
+        "required": True,
+    }
+
+
+def parse_form(form, model: type[BaseModel], exclude: set[str]):
+    """Validate a form's text parts against model; empty parts count as absent, errors are a 422 as for JSON"""
+    data = {k: v for k, v in form.multi_items() if isinstance(v, str) and v != "" and k not in exclude}
+    try:
+        return model.model_validate(data)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
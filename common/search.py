@@ -0,0 +1,204 @@
+"""
+Name, city and pincode search behind /user/search.
+DatabaseSearch queries the normalized search_name/search_city columns: on
+Postgres prefix matches and pg_trgm word similarity (typo tolerance), both
+index-backed; elsewhere prefix and word-prefix LIKE only. MemorySearch keeps
+a sorted token index in the current process, allowing one typo per word; it
+suits a single worker (small deployments, tests) since other workers'
+writes only reach it on restart or after an import.
+"""
+
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from sqlalchemy import case, func, literal, or_, select
+import logging
+import uuid
+from .config import get_settings
+from . import db
+from .models import UserProfile
+from .schemas import PUBLIC_PROFILE_COLUMNS, dump_public_profile
+from .text import normalize
+
+
+# Field weights: a name prefix beats a pincode prefix beats a city prefix
+NAME_WEIGHT = 1.0
+PINCODE_WEIGHT = 0.9
+CITY_WEIGHT = 0.8
+# Matches that needed a typo correction count for this fraction of the field weight
+TYPO_FACTOR = 0.6
+# Shorter words are too ambiguous to correct
+TYPO_MIN_LENGTH = 4
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """Levenshtein distance <= 1"""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    for i, (x, y) in enumerate(zip(a, b)):
+        if x != y:
+            return a[i + 1:] == b[i + 1:] if len(a) == len(b) else a[i:] == b[i + 1:]
+    return True
+
+
+class SearchIndex(ABC):
+    async def start(self):
+        """Called once the database is up"""
+
+    def update(self, profile: UserProfile):
+        """Called after a profile was committed"""
+
+    async def rebuild(self):
+        """Called after bulk writes that bypass update()"""
+
+    @abstractmethod
+    async def search(self, session, q: str, category: str | None, limit: int) -> list[dict]:
+        """Public profiles matching q, best first"""
+
+
+class DatabaseSearch(SearchIndex):
+    def __init__(self, typo_threshold: float):
+        self.typo_threshold = typo_threshold
+
+    async def search(self, session, q: str, category: str | None, limit: int) -> list[dict]:
+        term = normalize(q)
+        if not term:
+            return []
+        name, city, pincode = UserProfile.search_name, UserProfile.search_city, UserProfile.pincode
+        # Patterns are built here rather than with startswith() so the planner sees a constant prefix
+        name_prefix = name.like(f"{term}%")
+        city_prefix = city.like(f"{term}%")
+        pincode_prefix = pincode.like(f"{term.replace(' ', '')}%")
+
+        if session.bind.dialect.name == "postgresql":
+            # %> (word similarity above the threshold) is what the trigram index can answer
+            await session.execute(
+                select(func.set_config("pg_trgm.word_similarity_threshold", str(self.typo_threshold), True))
+            )
+            match = or_(name_prefix, city_prefix, pincode_prefix, name.op("%>")(term), city.op("%>")(term))
+            score = func.greatest(
+                case((name_prefix, NAME_WEIGHT), else_=0.0),
+                case((pincode_prefix, PINCODE_WEIGHT), else_=0.0),
+                case((city_prefix, CITY_WEIGHT), else_=0.0),
+                func.word_similarity(term, name) * NAME_WEIGHT * TYPO_FACTOR,
+                func.word_similarity(term, city) * CITY_WEIGHT * TYPO_FACTOR,
+            )
+        else:
+            word_prefix = name.like(f"% {term}%")
+            match = or_(name_prefix, word_prefix, city_prefix, pincode_prefix)
+            score = case(
+                (name_prefix, NAME_WEIGHT),
+                (pincode_prefix, PINCODE_WEIGHT),
+                (city_prefix, CITY_WEIGHT),
+                else_=literal(NAME_WEIGHT * TYPO_FACTOR),
+            )
+
+        stmt = select(*PUBLIC_PROFILE_COLUMNS).where(match)
+        if category:
+            stmt = stmt.where(UserProfile.category == category)
+        stmt = stmt.order_by(score.desc(), UserProfile.full_name, UserProfile.id).limit(limit)
+        return [dump_public_profile(row) for row in await session.execute(stmt)]
+
+
+class MemorySearch(SearchIndex):
+    def __init__(self):
+        self._profiles: dict[uuid.UUID, tuple[dict, list[tuple[str, float]]]] = {}
+        # token -> {user id: best field weight}, plus the tokens in sorted order for prefix ranges
+        self._postings: dict[str, dict[uuid.UUID, float]] = {}
+        self._tokens: list[str] = []
+
+    async def start(self):
+        await self.rebuild()
+
+    async def rebuild(self):
+        self._profiles.clear()
+        self._postings.clear()
+        self._tokens.clear()
+        stmt = select(*PUBLIC_PROFILE_COLUMNS, UserProfile.search_name, UserProfile.search_city, UserProfile.pincode)
+        async with db.SessionLocal() as session:
+            for row in await session.execute(stmt):
+                self._add(row)
+        logging.info("Search index loaded with %d profiles", len(self._profiles))
+
+    def update(self, profile: UserProfile):
+        self._remove(profile.id)
+        self._add(profile)
+
+    def _add(self, row):
+        fields = (
+            (row.search_name, NAME_WEIGHT),
+            (normalize(row.pincode, 20), PINCODE_WEIGHT),
+            (row.search_city, CITY_WEIGHT),
+        )
+        tokens = {}
+        for value, weight in fields:
+            for token in (value or "").split():
+                tokens[token] = max(tokens.get(token, 0.0), weight)
+        self._profiles[row.id] = (dump_public_profile(row), list(tokens.items()))
+        for token, weight in tokens.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                insort(self._tokens, token)
+            postings[row.id] = weight
+
+    def _remove(self, uid: uuid.UUID):
+        entry = self._profiles.pop(uid, None)
+        if entry is None:
+            return
+        for token, _ in entry[1]:
+            postings = self._postings[token]
+            del postings[uid]
+            if not postings:
+                del self._postings[token]
+                del self._tokens[bisect_left(self._tokens, token)]
+
+    def _word_scores(self, word: str) -> dict[uuid.UUID, float]:
+        scores = {}
+        i = bisect_left(self._tokens, word)
+        while i < len(self._tokens) and self._tokens[i].startswith(word):
+            for uid, weight in self._postings[self._tokens[i]].items():
+                scores[uid] = max(scores.get(uid, 0.0), weight)
+            i += 1
+        # Digits (pincodes) are matched exactly; a "typo" there is a different place
+        if len(word) >= TYPO_MIN_LENGTH and not word.isdigit():
+            # A linear scan of the vocabulary; fine at the sizes this backend is meant for
+            for token in self._tokens:
+                if token.startswith(word) or not any(
+                    _within_one_edit(word, token[:n]) for n in (len(word) - 1, len(word), len(word) + 1)
+                ):
+                    continue
+                for uid, weight in self._postings[token].items():
+                    scores[uid] = max(scores.get(uid, 0.0), weight * TYPO_FACTOR)
+        return scores
+
+    async def search(self, session, q: str, category: str | None, limit: int) -> list[dict]:
+        words = (normalize(q) or "").split()
+        if not words:
+            return []
+        # Every word has to match some field; the score adds up each word's best match
+        totals = None
+        for word in words:
+            scores = self._word_scores(word)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {uid: totals[uid] + score for uid, score in scores.items() if uid in totals}
+        hits = [
+            (score, self._profiles[uid][0]) for uid, score in totals.items()
+            if not category or self._profiles[uid][0]["category"] == category
+        ]
+        hits.sort(key=lambda hit: (-hit[0], hit[1]["full_name"], hit[1]["id"]))
+        return [profile for _, profile in hits[:limit]]
+
+
+def _build_search_index() -> SearchIndex:
+    s = get_settings()
+    if s.search_backend == "database":
+        return DatabaseSearch(s.search_typo_threshold)
+    if s.search_backend == "memory":
+        return MemorySearch()
+    raise RuntimeError(f"Unknown SEARCH_BACKEND: {s.search_backend}")
+
+
+search_index = _build_search_index()
@@ -1,25 +1,98 @@
+from collections import OrderedDict
 from passlib.context import CryptContext
 from jose import jwt
-from .config import Settings
+from time import time
+import hashlib
+import threading
+from .config import get_settings
 
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+_settings = get_settings()
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__time_cost=_settings.argon2_time_cost,
+    argon2__memory_cost=_settings.argon2_memory_cost,
+    argon2__parallelism=_settings.argon2_parallelism,
+)
 
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def hash_passwords(passwords: list[str]) -> list[str]:
+    return [pwd_context.hash(p) for p in passwords]
+
+
 def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
 
 
+def verify_and_update_password(plain: str, hashed: str) -> tuple[bool, str | None]:
+    """Verify a password and return a new hash if the stored one uses outdated cost parameters"""
+    return pwd_context.verify_and_update(plain, hashed)
+
+
+class TokenCache:
+    """
+    Bounded LRU of already-verified JWT claims, keyed by the token's SHA-256.
+    Entries expire after the TTL or at the token's own exp, whichever is
+    sooner, and are ignored once settings are reloaded (e.g. a new secret).
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> dict | None:
+        key = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                claims, expires_at, settings = entry
+                if expires_at > time() and settings is get_settings():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return claims
+                del self._entries[key]
+            self.misses += 1
+        return None
+
+    def put(self, token: str, claims: dict):
+        expires_at = time() + self.ttl_seconds
+        if "exp" in claims:
+            expires_at = min(expires_at, float(claims["exp"]))
+        key = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            self._entries[key] = (claims, expires_at, get_settings())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache(_settings.token_cache_size, _settings.token_cache_ttl_seconds)
+
+
 def create_access_token(sub: str, category: str) -> str:
-    s = Settings()
+    s = get_settings()
     payload = {"sub": sub, "category": category}
     return jwt.encode(payload, s.jwt_secret, algorithm=s.jwt_algorithm)
 
 
 def decode_token(token: str) -> dict:
-    s = Settings()
-    return jwt.decode(token, s.jwt_secret, algorithms=[s.jwt_algorithm])
+    """Verify a token, skipping the signature check for recently verified ones"""
+    claims = token_cache.get(token)
+    if claims is None:
+        s = get_settings()
+        claims = jwt.decode(token, s.jwt_secret, algorithms=[s.jwt_algorithm])
+        token_cache.put(token, claims)
+    return claims
@@ -0,0 +1,93 @@
+"""
+Serving for files that never change once written (uploads, photo blobs and
+their variants): strong ETags, 304 on If-None-Match, immutable caching,
+Range requests, and zero-copy sends when the ASGI server offers them.
+"""
+
+from collections import OrderedDict
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+import anyio
+import hashlib
+import os
+import re
+import threading
+
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_DIGEST_PREFIX_RE = re.compile(r"^[0-9a-f]{64}")
+_ETAG_CACHE_SIZE = 4096
+_etag_cache: OrderedDict = OrderedDict()
+_etag_lock = threading.Lock()
+
+
+def file_etag(path: str) -> str:
+    """
+    Strong ETag for a file. Content-addressed names already carry the digest;
+    anything else (e.g. legacy UUID uploads) is hashed once and memoized.
+    """
+    name = os.path.basename(path)
+    if _DIGEST_PREFIX_RE.match(name):
+        return f'"{name}"'
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    with _etag_lock:
+        if key in _etag_cache:
+            _etag_cache.move_to_end(key)
+            return _etag_cache[key]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    etag = f'"{digest.hexdigest()}"'
+    with _etag_lock:
+        _etag_cache[key] = etag
+        while len(_etag_cache) > _ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+    return etag
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison function
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class ImmutableFileResponse(FileResponse):
+    def __init__(self, path: str, etag: str, media_type: str | None = None, headers: dict | None = None):
+        headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": etag, **(headers or {})}
+        super().__init__(path, media_type=media_type, headers=headers)
+
+    async def __call__(self, scope, receive, send):
+        request_headers = Headers(scope=scope)
+        if etag_matches(request_headers.get("if-none-match"), self.headers["etag"]):
+            kept = {k: v for k, v in self.headers.items() if k in ("etag", "cache-control", "vary")}
+            await Response(status_code=304, headers=kept)(scope, receive, send)
+            return
+
+        extensions = scope.get("extensions") or {}
+        zero_copy = "http.response.pathsend" in extensions or "http.response.zerocopy" in extensions
+        if not zero_copy or "range" in request_headers or scope["method"].upper() == "HEAD":
+            # Starlette handles Range/If-Range and chunked reads
+            await super().__call__(scope, receive, send)
+            return
+
+        stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+        self.set_stat_headers(stat_result)
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+        else:
+            async with await anyio.open_file(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": f.wrapped,
+                    "count": stat_result.st_size,
+                    "more_body": False,
+                })
+        if self.background is not None:
+            await self.background()
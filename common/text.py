@@ -0,0 +1,24 @@
+"""
+Text normalization for the search columns.
+Latin diacritics are dropped (other scripts keep their combining signs),
+case is folded and anything that is not a letter or digit becomes a single
+space, so "  Sri  Lakshmī's Store" is stored and searched as
+"sri lakshmi s store". The result never contains LIKE wildcards.
+"""
+
+import re
+import unicodedata
+
+
+# Combining Diacritical Marks; Indic vowel signs live elsewhere and are kept
+_LATIN_MARKS = re.compile("[\u0300-\u036f]")
+
+
+def normalize(value: str | None, max_length: int = 255) -> str | None:
+    if not value:
+        return None
+    value = _LATIN_MARKS.sub("", unicodedata.normalize("NFKD", value))
+    value = unicodedata.normalize("NFC", value).casefold()
+    # Letters, digits and combining signs (Indic vowel signs are not \w to re) make words
+    chars = (ch if ch.isalnum() or unicodedata.category(ch)[0] == "M" else " " for ch in value)
+    return " ".join("".join(chars).split())[:max_length] or None
@@ -2,14 +2,19 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from services.auth.router import router as auth_router
 from services.user.router import router as user_router
-from fastapi.staticfiles import StaticFiles
-from services.files.router import router as files_router
-import logging
+from services.files.router import router as files_router, UPLOAD_DIR
+from services.admin.router import router as admin_router
+from common.lifespan import create_lifespan, readiness_router
+from common.log import RequestIdMiddleware, configure_logging
+from common.ratelimit import AdmissionMiddleware
+from common.metrics import MetricsMiddleware, metrics_router
 import os
 
 
-logging.basicConfig(level=logging.INFO)
-app = FastAPI()
+configure_logging()
+app = FastAPI(lifespan=create_lifespan(database=True, auth=True))
+# Innermost, so its 429/503 responses still get CORS headers
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -18,11 +23,14 @@ app.add_middleware(
     ,
     allow_headers=["*"]
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)
+app.include_router(readiness_router)
+app.include_router(metrics_router)
 app.include_router(auth_router, prefix="/auth")
 app.include_router(user_router, prefix="/user")
 app.include_router(files_router, prefix="/files")
+app.include_router(admin_router, prefix="/admin")
 
 # Create uploads directory if it doesn't exist
-uploads_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads")
-os.makedirs(uploads_dir, exist_ok=True)
-app.mount("/files/static", StaticFiles(directory=uploads_dir), name="files-static")
\ No newline at end of file
+os.makedirs(UPLOAD_DIR, exist_ok=True)
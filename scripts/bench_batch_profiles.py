@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Compare one POST /user/batch for N ids against N single-id lookups, the
+way a client rendering N vendor cards would otherwise fetch them.
+
+Runs the gateway app in-process; --sqlite seeds a throwaway SQLite database
+(requires aiosqlite), otherwise DATABASE_URL is used and the seeded users
+are left behind under a random mobile number prefix.
+
+Usage:
+  python scripts/bench_batch_profiles.py --sqlite [--ids 100] [--rounds 20] [--concurrency 10]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_endpoints import print_results, run_phase
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sqlite", action="store_true", help="against a throwaway SQLite database")
+    parser.add_argument("--ids", type=int, default=100, help="profiles per lookup")
+    parser.add_argument("--rounds", type=int, default=20, help="times each lookup is repeated")
+    parser.add_argument("--concurrency", type=int, default=10, help="parallel requests for the single-id lookups")
+    return parser.parse_args()
+
+
+async def seed(count: int) -> list:
+    from common import db
+    from common.models import UserProfile
+
+    prefix = random.randint(100, 999)
+    users = [
+        UserProfile(
+            full_name=f"Bench Vendor {i}",
+            mobile_no=f"8{prefix}{i:06d}",
+            password="not-a-hash",
+            category="Vendor",
+            city="Hyderabad",
+            state="Telangana",
+        )
+        for i in range(count)
+    ]
+    async with db.SessionLocal() as session:
+        session.add_all(users)
+        await session.commit()
+    return [str(u.id) for u in users]
+
+
+async def bench(args) -> dict:
+    import httpx
+    from common.security import create_access_token
+    from gateway.main import app
+
+    async with app.router.lifespan_context(app):
+        ids = await seed(args.ids)
+        headers = {"Authorization": f"Bearer {create_access_token(ids[0], 'Vendor')}"}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+
+            async def one_batch(_):
+                r = await client.post("/user/batch", headers=headers, json={"ids": ids})
+                return r.status_code == 200 and len(r.json()["items"]) == len(ids)
+
+            async def single_ids(_):
+                # What a client without /user/batch does: one request per card, in parallel
+                async def lookup(i):
+                    r = await client.post("/user/batch", headers=headers, json={"ids": [ids[i]]})
+                    return r.status_code == 200
+                phase = await run_phase(len(ids), args.concurrency, lookup)
+                return phase["errors"] == 0
+
+            return {
+                f"batch x{args.ids}": await run_phase(args.rounds, 1, one_batch),
+                f"{args.ids} single": await run_phase(args.rounds, 1, single_ids),
+            }
+
+
+def main():
+    args = parse_args()
+    if args.sqlite:
+        workdir = tempfile.mkdtemp(prefix="shaaka-bench-")
+        os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}", OTP_BACKEND="memory")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Admission control would shed the single-id fan-out, which is not what is being measured
+    os.environ.setdefault("MAX_CONCURRENT_REQUESTS", "0")
+
+    results = asyncio.run(bench(args))
+    print_results(results, None, 0)
+
+
+if __name__ == "__main__":
+    main()
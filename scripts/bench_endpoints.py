@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the auth, user and files endpoints.
+
+By default the gateway app runs in-process behind httpx's ASGI transport,
+with its lifespan started here. --sqlite points DATABASE_URL (and the blob,
+upload and image cache directories) at a throwaway directory so no Postgres
+is needed; this requires aiosqlite. --url drives an already running server
+instead; registration then needs OTP_BACKEND=postgres on both sides so the
+benchmark can read the codes it sent from the shared database.
+
+Reports throughput and p50/p95/p99 per endpoint. --save writes the results
+as JSON, --compare checks them against a saved baseline and exits non-zero
+when p95 or throughput regress by more than --threshold percent.
+
+Usage:
+  python scripts/bench_endpoints.py --sqlite [--requests 200] [--concurrency 10]
+  python scripts/bench_endpoints.py --url http://localhost:8000 --save baseline.json
+  python scripts/bench_endpoints.py --sqlite --compare baseline.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+ENDPOINTS = ("send-otp", "register", "login", "me", "update-profile", "upload")
+PASSWORD = "bench-password"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--sqlite", action="store_true", help="in-process against a throwaway SQLite database")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--only", help="comma-separated subset of: " + ",".join(ENDPOINTS))
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed regression in percent")
+    return parser.parse_args()
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+async def run_phase(count: int, concurrency: int, request) -> dict:
+    """Call request(i) for i in range(count) with bounded concurrency and summarise the latencies"""
+    latencies = []
+    errors = 0
+    next_index = iter(range(count))
+
+    async def worker():
+        nonlocal errors
+        for i in next_index:
+            started = time.perf_counter()
+            try:
+                ok = await request(i)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "count": count,
+        "errors": errors,
+        "rps": count / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def sample_png(i: int) -> bytes:
+    from PIL import Image
+
+    # A distinct colour per request so each upload is a new blob rather than a dedup hit
+    buffer = io.BytesIO()
+    Image.new("RGB", (256, 256), (i % 256, i // 256 % 256, 40)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def bench(client, read_otp, args) -> dict:
+    selected = args.only.split(",") if args.only else list(ENDPOINTS)
+    n = args.requests
+    prefix = random.randint(100, 999)
+    mobiles = [f"9{prefix}{i:06d}" for i in range(n)]
+    tokens = []
+    results = {}
+
+    async def send_otp(i):
+        r = await client.post("/auth/send-otp", json={"mobile_no": mobiles[i]})
+        return r.status_code == 200
+
+    async def register(i):
+        code = await read_otp(mobiles[i])
+        r = await client.post("/auth/register", json={
+            "full_name": f"Bench User {i}",
+            "mobile_no": mobiles[i],
+            "password": PASSWORD,
+            "category": "Vendor",
+            "city": "Hyderabad",
+            "latitude": 17.385 + i * 1e-4,
+            "longitude": 78.4867,
+            "otp_code": code,
+        })
+        return r.status_code == 200
+
+    async def login(i):
+        r = await client.post("/auth/login", json={"mobile_no": mobiles[i], "password": PASSWORD})
+        if r.status_code == 200:
+            tokens.append(r.json()["access_token"])
+        return r.status_code == 200
+
+    async def me(i):
+        r = await client.get("/user/me", headers={"Authorization": f"Bearer {tokens[i % len(tokens)]}"})
+        return r.status_code == 200
+
+    async def update_profile(i):
+        r = await client.post(
+            "/user/update-profile",
+            headers={"Authorization": f"Bearer {tokens[i % len(tokens)]}"},
+            json={"city": f"City {i}"},
+        )
+        return r.status_code == 200
+
+    async def upload(i):
+        r = await client.post("/files/upload", files={"file": (f"bench{i}.png", images[i], "image/png")})
+        return r.status_code == 200
+
+    # send-otp is always run (untimed if not selected) because register needs the codes
+    phase = await run_phase(n, args.concurrency, send_otp)
+    if "send-otp" in selected:
+        results["send-otp"] = phase
+    if {"register", "login", "me", "update-profile"} & set(selected):
+        phase = await run_phase(n, args.concurrency, register)
+        if "register" in selected:
+            results["register"] = phase
+        phase = await run_phase(n, args.concurrency, login)
+        if "login" in selected:
+            results["login"] = phase
+        if tokens:
+            if "me" in selected:
+                results["me"] = await run_phase(n, args.concurrency, me)
+            if "update-profile" in selected:
+                results["update-profile"] = await run_phase(n, args.concurrency, update_profile)
+    if "upload" in selected:
+        images = [sample_png(i) for i in range(n)]
+        results["upload"] = await run_phase(n, args.concurrency, upload)
+    return results
+
+
+async def run_in_process(args) -> dict:
+    import httpx
+    from common.otp import otp_store
+    from gateway.main import app
+
+    async def read_otp(mobile_no):
+        stored = await otp_store.get(mobile_no)
+        return stored[0] if stored else ""
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            return await bench(client, read_otp, args)
+
+
+async def run_against_url(args) -> dict:
+    import httpx
+    from common import db
+    from common.config import get_settings
+    from common.otp import PostgresOtpStore
+
+    shared = get_settings().otp_backend == "postgres" and get_settings().database_url
+    if shared:
+        await db.ensure_engine()
+        store = PostgresOtpStore(sweep_interval=3600)
+    else:
+        print("OTP_BACKEND is not postgres: register and the endpoints after it will fail", file=sys.stderr)
+
+    async def read_otp(mobile_no):
+        stored = await store.get(mobile_no) if shared else None
+        return stored[0] if stored else ""
+
+    try:
+        async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+            return await bench(client, read_otp, args)
+    finally:
+        if shared:
+            await db.dispose_engine()
+
+
+def print_results(results: dict, baseline: dict | None, threshold: float) -> bool:
+    regressed = False
+    print(f"{'endpoint':<16} {'count':>6} {'errors':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, r in results.items():
+        print(f"{name:<16} {r['count']:>6} {r['errors']:>6} {r['rps']:>9.1f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f}")
+        base = (baseline or {}).get(name)
+        if not base:
+            continue
+        p95_change = (r["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100 if base["p95_ms"] else 0.0
+        rps_change = (r["rps"] - base["rps"]) / base["rps"] * 100 if base["rps"] else 0.0
+        flag = ""
+        if p95_change > threshold or rps_change < -threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"{'':<16} vs baseline: p95 {p95_change:+.1f}%, req/s {rps_change:+.1f}%{flag}")
+    return regressed
+
+
+def main():
+    args = parse_args()
+    if args.sqlite:
+        workdir = tempfile.mkdtemp(prefix="shaaka-bench-")
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            BLOB_DIR=os.path.join(workdir, "blobs"),
+            UPLOAD_DIR=os.path.join(workdir, "uploads"),
+            IMAGE_CACHE_DIR=os.path.join(workdir, "image_cache"),
+            OTP_BACKEND="memory",
+        )
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if not args.url:
+        # Every in-process request comes from the same client address, so per-IP rate limits
+        # and admission control would answer most of the load with 429s instead of measuring it
+        os.environ.setdefault("RATE_LIMITS", "{}")
+        os.environ.setdefault("MAX_CONCURRENT_REQUESTS", "0")
+
+    results = asyncio.run(run_against_url(args) if args.url else run_in_process(args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    regressed = print_results(results, baseline, args.threshold)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "meta": {
+                    "target": args.url or ("in-process sqlite" if args.sqlite else "in-process"),
+                    "requests": args.requests,
+                    "concurrency": args.concurrency,
+                    "python": platform.python_version(),
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                },
+                "results": results,
+            }, f, indent=2)
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
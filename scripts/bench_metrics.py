@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Measure the hot-path cost of common.metrics: MetricsMiddleware around a
+trivial ASGI app, and the SQLAlchemy cursor event pair run per statement.
+Exits non-zero when either exceeds the budget, so it can gate CI.
+
+Usage: python scripts/bench_metrics.py [iterations] [budget_us]
+"""
+
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from common.metrics import MetricsMiddleware, _after_cursor_execute, _before_cursor_execute
+
+
+ROUTE = SimpleNamespace(path="/user/photo/{photo_hash}")
+
+
+async def endpoint(scope, receive, send):
+    scope["route"] = ROUTE  # what FastAPI's router does on a match
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def per_request_us(app, iterations: int) -> float:
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await app({"type": "http", "method": "GET", "path": "/user/photo/x"}, receive, send)
+        best = min(best, time.perf_counter() - started)
+    return best / iterations * 1e6
+
+
+def per_statement_us(iterations: int) -> float:
+    conn = SimpleNamespace(info={})
+    statement = "SELECT user_profiles.id FROM user_profiles WHERE user_profiles.id = %(id)s"
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            _before_cursor_execute(conn, None, statement, None, None, False)
+            _after_cursor_execute(conn, None, statement, None, None, False)
+        best = min(best, time.perf_counter() - started)
+    return best / iterations * 1e6
+
+
+def main(iterations: int, budget_us: float):
+    bare = asyncio.run(per_request_us(endpoint, iterations))
+    wrapped = asyncio.run(per_request_us(MetricsMiddleware(endpoint), iterations))
+    middleware = wrapped - bare
+    statement = per_statement_us(iterations)
+    print(f"{'bare app':<24} {bare:>8.2f} us/request")
+    print(f"{'with middleware':<24} {wrapped:>8.2f} us/request")
+    print(f"{'middleware overhead':<24} {middleware:>8.2f} us/request")
+    print(f"{'cursor events':<24} {statement:>8.2f} us/statement")
+    if middleware > budget_us or statement > budget_us:
+        print(f"over budget of {budget_us} us")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 50_000,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 5.0,
+    )
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Benchmark the /user/nearby strategy over synthetic profiles.
+Compares a full scan with exact distances against the geohash cover used by
+the endpoint, where a sorted list stands in for the btree index.
+
+--db also runs the endpoint's own query (first page, nearest first) against
+DATABASE_URL; on Postgres that measures the COLLATE "C" geohash range scans
+and prints the plan. --sqlite uses a throwaway SQLite database instead
+(requires aiosqlite). The profiles are seeded under their own category and
+deleted afterwards.
+
+Usage: python scripts/bench_nearby.py [profiles] [radius_km] [--db] [--sqlite]
+"""
+
+import argparse
+import asyncio
+import bisect
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from decimal import Decimal
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from common import geo
+
+
+CENTER = (17.3850, 78.4867)  # Hyderabad
+SPREAD_DEG = 1.0
+# Keeps the seeded profiles out of real nearby results and easy to delete
+BENCH_CATEGORY = "Bench"
+PAGE_SIZE = 20
+INSERT_BATCH = 5000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("profiles", nargs="?", type=int, default=100_000)
+    parser.add_argument("radius_km", nargs="?", type=float, default=5.0)
+    parser.add_argument("--db", action="store_true", help="also run the endpoint query against the database")
+    parser.add_argument("--sqlite", action="store_true", help="with --db, use a throwaway SQLite database")
+    return parser.parse_args()
+
+
+def main(count: int, radius_km: float):
+    rng = random.Random(42)
+    points = [
+        (CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG), CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG))
+        for _ in range(count)
+    ]
+    started = time.perf_counter()
+    index = sorted((geo.encode(lat, lng), i) for i, (lat, lng) in enumerate(points))
+    keys = [k for k, _ in index]
+    print(f"{count} profiles, geohash index built in {time.perf_counter() - started:.2f}s")
+
+    queries = [
+        (CENTER[0] + rng.uniform(-0.5, 0.5), CENTER[1] + rng.uniform(-0.5, 0.5))
+        for _ in range(50)
+    ]
+
+    started = time.perf_counter()
+    expected = []
+    for lat, lng in queries:
+        expected.append(sorted(
+            i for i, (plat, plng) in enumerate(points)
+            if geo.haversine_km(lat, lng, plat, plng) <= radius_km
+        ))
+    scan = (time.perf_counter() - started) / len(queries)
+
+    started = time.perf_counter()
+    scanned = 0
+    for (lat, lng), want in zip(queries, expected):
+        found = []
+        for prefix in geo.cover(lat, lng, radius_km):
+            lo = bisect.bisect_left(keys, prefix)
+            hi = bisect.bisect_left(keys, prefix + "{")
+            for _, i in index[lo:hi]:
+                scanned += 1
+                plat, plng = points[i]
+                if geo.haversine_km(lat, lng, plat, plng) <= radius_km:
+                    found.append(i)
+        assert sorted(found) == want, "geohash cover missed profiles"
+    indexed = (time.perf_counter() - started) / len(queries)
+
+    matches = sum(len(w) for w in expected) / len(queries)
+    print(f"radius {radius_km} km, {matches:.0f} matches per query")
+    print(f"full scan      {scan * 1000:>9.2f} ms/query, {count} rows examined")
+    print(f"geohash cover  {indexed * 1000:>9.2f} ms/query, {scanned / len(queries):.0f} rows examined")
+    return points, queries, expected
+
+
+async def bench_database(points: list, queries: list, expected: list, radius_km: float):
+    from sqlalchemy import delete, text
+    from common import db
+    from common.models import UserProfile
+    from services.user.router import nearby_query
+
+    await db.ensure_engine()
+    prefix = random.randint(100, 999)
+    ids = [uuid.uuid4() for _ in points]
+    try:
+        started = time.perf_counter()
+        async with db.SessionLocal() as session:
+            for start in range(0, len(points), INSERT_BATCH):
+                await session.execute(UserProfile.__table__.insert(), [
+                    {
+                        "id": ids[i],
+                        "full_name": f"Bench Vendor {i}",
+                        "mobile_no": f"5{prefix}{i:06d}",
+                        "password": "not-a-hash",
+                        "category": BENCH_CATEGORY,
+                        "latitude": Decimal(f"{lat:.7f}"),
+                        "longitude": Decimal(f"{lng:.7f}"),
+                        "geohash": geo.encode(lat, lng),
+                    }
+                    for i, (lat, lng) in enumerate(points[start:start + INSERT_BATCH], start)
+                ])
+            await session.commit()
+            # Fresh statistics, or the planner may prefer the category index over the geohash ranges
+            await session.execute(text("ANALYZE user_profiles"))
+            await session.commit()
+        print(f"seeded {len(points)} profiles in {time.perf_counter() - started:.2f}s")
+
+        index_of = {uid: i for i, uid in enumerate(ids)}
+        async with db.SessionLocal() as session:
+            started = time.perf_counter()
+            for (lat, lng), want in zip(queries, expected):
+                stmt = nearby_query(lat, lng, radius_km, (BENCH_CATEGORY,), None, PAGE_SIZE)
+                found = [index_of[row.id] for row in await session.execute(stmt)]
+                nearest = sorted(want, key=lambda i: (round(geo.haversine_km(lat, lng, *points[i]), 6), str(ids[i])))
+                assert found == nearest[:PAGE_SIZE], "database page differs from the exact nearest profiles"
+            elapsed = (time.perf_counter() - started) / len(queries)
+            print(f"database page  {elapsed * 1000:>9.2f} ms/query, {PAGE_SIZE} nearest ({db.Engine.dialect.name})")
+
+            if db.Engine.dialect.name == "postgresql":
+                stmt = nearby_query(*queries[0], radius_km, (BENCH_CATEGORY,), None, PAGE_SIZE)
+                sql = stmt.compile(dialect=db.Engine.dialect, compile_kwargs={"literal_binds": True})
+                for line in await session.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}")):
+                    print(f"  {line[0]}")
+    finally:
+        async with db.SessionLocal() as session:
+            await session.execute(delete(UserProfile).where(
+                UserProfile.category == BENCH_CATEGORY, UserProfile.mobile_no.like(f"5{prefix}%")
+            ))
+            await session.commit()
+        await db.dispose_engine()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = main(args.profiles, args.radius_km)
+    if args.db:
+        if args.sqlite:
+            workdir = tempfile.mkdtemp(prefix="shaaka-bench-")
+            os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        asyncio.run(bench_database(*results, args.radius_km))
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Compare the bytes pulled from the database per request before and after
+deferring the large UserProfile columns.
+
+Usage: DATABASE_URL=postgresql://... python scripts/bench_profile_columns.py <mobile_no>
+"""
+
+import asyncio
+import os
+import sys
+from sqlalchemy import inspect, select
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from common import db
+from common.models import UserProfile
+
+
+def row_bytes(values) -> int:
+    total = 0
+    for value in values:
+        if value is None:
+            continue
+        total += len(value.encode("utf-8")) if isinstance(value, str) else len(str(value))
+    return total
+
+
+async def measure(mobile_no: str):
+    await db.ensure_engine()
+    columns = list(UserProfile.__table__.columns)
+    by_mobile = UserProfile.mobile_no == mobile_no
+
+    queries = {
+        # What every endpoint did before: the whole row, photo bytes included
+        "before (login/me)": select(*columns).where(by_mobile),
+        "after  (login)": select(UserProfile.id, UserProfile.password, UserProfile.category).where(by_mobile),
+        # Exactly the columns select(UserProfile) loads now that the big ones are deferred
+        "after  (me)": select(*[
+            attr.columns[0] for attr in inspect(UserProfile).column_attrs
+            if not attr.deferred
+        ]).where(by_mobile),
+    }
+
+    async with db.SessionLocal() as session:
+        for label, stmt in queries.items():
+            row = (await session.execute(stmt)).first()
+            if row is None:
+                print(f"No user with mobile_no {mobile_no}")
+                return
+            print(f"{label:<20} {len(row):>3} columns {row_bytes(row):>10} bytes")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    asyncio.run(measure(sys.argv[1]))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark serialization of the /user/me payload: the old hand-built dict
+through FastAPI's jsonable_encoder and stdlib JSON, against dump_profile with
+ORJSONResponse, with and without a ?fields= subset.
+
+Usage: python scripts/bench_profile_response.py [iterations]
+"""
+
+import os
+import sys
+import timeit
+import uuid
+from decimal import Decimal
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from common.models import UserProfile
+from common.schemas import ProfileResponse, dump_profile, parse_fields
+
+
+def sample_profile() -> UserProfile:
+    photo_hash = "ab" * 32
+    return UserProfile(
+        id=uuid.uuid4(),
+        full_name="Lakshmi Narayanan",
+        mobile_no="9876543210",
+        gender="Female",
+        category="Women Merchant",
+        address_line="12-3-456, Street No. 7, Near Clock Tower",
+        city="Hyderabad",
+        state="Telangana",
+        country="India",
+        pincode="500001",
+        latitude=Decimal("17.3850440"),
+        longitude=Decimal("78.4866710"),
+        profile_photo_url=f"/user/photo/{photo_hash}",
+        profile_photo_hash=photo_hash,
+        profile_photo_mime_type="image/jpeg",
+    )
+
+
+def before(obj: UserProfile) -> bytes:
+    # What /user/me did before: hand-built dict, then FastAPI's encoder and stdlib JSON
+    content = {
+        "id": str(obj.id),
+        "full_name": obj.full_name,
+        "mobile_no": obj.mobile_no,
+        "gender": obj.gender,
+        "category": obj.category,
+        "address_line": obj.address_line,
+        "city": obj.city,
+        "state": obj.state,
+        "country": obj.country,
+        "pincode": obj.pincode,
+        "latitude": float(obj.latitude) if obj.latitude is not None else None,
+        "longitude": float(obj.longitude) if obj.longitude is not None else None,
+        "profile_photo_url": obj.profile_photo_url,
+        "profile_photo_hash": obj.profile_photo_hash,
+        "profile_photo_mime_type": obj.profile_photo_mime_type,
+    }
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def per_call_us(fn, iterations: int) -> float:
+    return min(timeit.repeat(fn, number=iterations, repeat=5)) / iterations * 1e6
+
+
+def main(iterations: int):
+    obj = sample_profile()
+    subset = parse_fields("full_name,category,profile_photo_url")
+    cases = {
+        "dict + stdlib json": lambda: before(obj),
+        "validated model": lambda: JSONResponse(ProfileResponse.model_validate(obj, from_attributes=True).model_dump(mode="json")).body,
+        "dump_profile + orjson": lambda: ORJSONResponse(dump_profile(obj)).body,
+        "fields=3 + orjson": lambda: ORJSONResponse(dump_profile(obj, subset)).body,
+    }
+    baseline = per_call_us(cases["dict + stdlib json"], iterations)
+    for label, fn in cases.items():
+        us = per_call_us(fn, iterations)
+        print(f"{label:<24} {len(fn()):>6} bytes {us:>10.2f} us/call {baseline / us:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
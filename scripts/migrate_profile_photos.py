@@ -1,9 +1,18 @@
 #!/usr/bin/env python3
 """
-Database migration script to add profile photo columns to user_profiles table.
-Run this to add the new columns for storing profile pictures in Neon PostgreSQL.
+Apply pending schema migrations (the same runner the app uses at startup)
+and copy legacy base64 profile photos into the blob store.
+Run this against Neon PostgreSQL before or after deploying.
+
+The base64 column is kept: photos are written to the local BLOB_DIR, which is
+only where the app serves from when this runs on the service's persistent
+disk. Once photos load, run again with --drop-legacy-data on that instance to
+clear the column for rows whose blob is present there.
 """
 
+import argparse
+import base64
+import hashlib
 import os
 import sys
 from sqlalchemy import create_engine, text
@@ -12,52 +21,43 @@ from sqlalchemy.orm import sessionmaker
 # Add the backend directory to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from common.config import Settings
+from common.config import get_settings
+from common.blobstore import photo_store
+from common.migrations import run_migrations
 
-def migrate_database():
-    """Add profile photo columns to user_profiles table"""
+def migrate_database(drop_legacy_data: bool = False):
+    """Apply pending migrations and backfill the photo blob store"""
     
-    settings = Settings()
-    database_url = settings.database_url
+    settings = get_settings()
+    database_url = settings.database_url.replace('postgresql://', 'postgresql+psycopg://', 1)
     
-    print(f"Connecting to database: {database_url}")
+    print("Connecting to database...")
     
     try:
         # Create engine and connect
         engine = create_engine(database_url)
         
-        # Create session
-        Session = sessionmaker(bind=engine)
-        session = Session()
-        
-        # SQL to add new columns
-        migration_sql = """
-        ALTER TABLE user_profiles 
-        ADD COLUMN IF NOT EXISTS profile_photo_data TEXT,
-        ADD COLUMN IF NOT EXISTS profile_photo_mime_type VARCHAR(50);
-        """
-        
-        print("Executing migration...")
-        session.execute(text(migration_sql))
-        session.commit()
+        print("Executing migrations...")
+        with engine.begin() as conn:
+            run_migrations(conn)
+            versions = conn.execute(text("SELECT version, name FROM schema_migrations ORDER BY version")).fetchall()
         
         print("✅ Migration completed successfully!")
-        print("Added columns: profile_photo_data, profile_photo_mime_type")
+        print("\n📊 Applied migrations:")
+        for version, name in versions:
+            print(f"  - {version}: {name}")
         
-        # Verify the changes
-        verify_sql = """
-        SELECT column_name, data_type, character_maximum_length
-        FROM information_schema.columns 
-        WHERE table_name = 'user_profiles' 
-        AND column_name IN ('profile_photo_data', 'profile_photo_mime_type');
-        """
+        # Create session
+        Session = sessionmaker(bind=engine)
+        session = Session()
         
-        result = session.execute(text(verify_sql))
-        columns = result.fetchall()
+        print(f"\n📁 Blob store: {photo_store.root}")
+        moved, restored = backfill_blob_store(session)
+        print(f"📦 Copied {moved} legacy photos into the blob store, restored {restored} missing blobs")
         
-        print("\n📊 Verified columns:")
-        for column in columns:
-            print(f"  - {column.column_name}: {column.data_type} ({column.character_maximum_length or 'N/A'})")
+        if drop_legacy_data:
+            cleared, missing = drop_legacy_photo_data(session)
+            print(f"🧹 Cleared legacy data for {cleared} photos; kept {missing} whose blob is missing here")
         
         session.close()
         
@@ -68,5 +68,83 @@ def migrate_database():
             session.close()
         sys.exit(1)
 
+def _legacy_rows(session, columns: str, where: str):
+    """Yield rows that still hold legacy photo data, 100 at a time in id order"""
+    after = None
+    while True:
+        query = f"SELECT id, {columns} FROM user_profiles WHERE profile_photo_data IS NOT NULL AND {where}"
+        if after is not None:
+            query += " AND id > :after"
+        rows = session.execute(text(query + " ORDER BY id LIMIT 100;"), {"after": after}).fetchall()
+        if not rows:
+            return
+        yield rows
+        session.commit()
+        after = rows[-1].id
+
+def backfill_blob_store(session):
+    """
+    Write base64 photos still held in user_profiles rows to the blob store.
+    Rows already pointing at a blob that is missing here get it written again.
+    """
+    
+    moved = restored = 0
+    for rows in _legacy_rows(session, "profile_photo_data, profile_photo_hash", "TRUE"):
+        for row in rows:
+            if row.profile_photo_hash is not None:
+                if photo_store.stat(row.profile_photo_hash) is None:
+                    photo_store.put(base64.b64decode(row.profile_photo_data))
+                    restored += 1
+                continue
+            photo_hash = photo_store.put(base64.b64decode(row.profile_photo_data))
+            session.execute(
+                text("""
+                UPDATE user_profiles
+                SET profile_photo_hash = :hash,
+                    profile_photo_url = :url,
+                    version = version + 1
+                WHERE id = :id;
+                """),
+                {"hash": photo_hash, "url": f"/user/photo/{photo_hash}", "id": row.id},
+            )
+            moved += 1
+    return moved, restored
+
+def _blob_is_intact(photo_hash: str) -> bool:
+    found = photo_store.stat(photo_hash)
+    if found is None:
+        return False
+    digest = hashlib.sha256()
+    with open(found[0], "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest() == photo_hash
+
+def drop_legacy_photo_data(session):
+    """Clear profile_photo_data only where this BLOB_DIR holds the photo with the expected digest"""
+    
+    cleared = missing = 0
+    for rows in _legacy_rows(session, "profile_photo_hash", "profile_photo_hash IS NOT NULL"):
+        for row in rows:
+            if not _blob_is_intact(row.profile_photo_hash):
+                missing += 1
+                continue
+            session.execute(
+                text("""
+                UPDATE user_profiles
+                SET profile_photo_data = NULL
+                WHERE id = :id AND profile_photo_hash = :hash;
+                """),
+                {"id": row.id, "hash": row.profile_photo_hash},
+            )
+            cleared += 1
+    return cleared, missing
+
 if __name__ == "__main__":
-    migrate_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--drop-legacy-data",
+        action="store_true",
+        help="after the backfill, clear base64 data for photos present in this BLOB_DIR",
+    )
+    migrate_database(parser.parse_args().drop_legacy_data)
@@ -0,0 +1,12 @@
+from fastapi import FastAPI
+from common.lifespan import create_lifespan, readiness_router
+from common.log import RequestIdMiddleware, configure_logging
+from .router import router
+
+
+configure_logging()
+# Password hashing runs here too, so the auth lifespan shuts the pool down
+app = FastAPI(lifespan=create_lifespan(database=True, auth=True))
+app.add_middleware(RequestIdMiddleware)
+app.include_router(readiness_router)
+app.include_router(router, prefix="/admin")
@@ -0,0 +1,246 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from decimal import Decimal
+from typing import Literal
+import asyncio
+import csv
+import hmac
+import io
+import json
+import logging
+import orjson
+import tempfile
+import uuid
+from common import db as database
+from common import geo
+from common.config import get_settings
+from common.db import get_db
+from common.hashing import password_hasher, HashingBusy
+from common.models import UserProfile
+from common.search import search_index
+from common.text import normalize
+
+
+router = APIRouter()
+security = HTTPBearer()
+
+CATEGORIES = ('Vendor', 'Women Merchant', 'Customer')
+REQUIRED_FIELDS = ('full_name', 'mobile_no', 'password', 'category')
+OPTIONAL_FIELDS = ('gender', 'address_line', 'city', 'state', 'country', 'pincode', 'latitude', 'longitude')
+# Bounded column widths, taken from the model; COPY would otherwise fail the import partway through
+MAX_LENGTHS = {
+    k: UserProfile.__table__.c[k].type.length
+    for k in REQUIRED_FIELDS + OPTIONAL_FIELDS
+    if getattr(UserProfile.__table__.c[k].type, 'length', None)
+}
+# Columns written by an import, in COPY order
+IMPORT_COLUMNS = ('id', *REQUIRED_FIELDS, *OPTIONAL_FIELDS, 'geohash', 'search_name', 'search_city')
+EXPORT_COLUMNS = (
+    'id', 'full_name', 'mobile_no', 'gender', 'category', 'address_line', 'city', 'state', 'country',
+    'pincode', 'latitude', 'longitude', 'created_at', 'updated_at',
+)
+PHOTO_COLUMNS = ('profile_photo_url', 'profile_photo_hash', 'profile_photo_mime_type')
+MAX_REPORTED_ERRORS = 100
+SPOOL_MEMORY_BYTES = 8 * 1024 * 1024
+
+
+def require_admin(creds: HTTPAuthorizationCredentials = Depends(security)):
+    token = get_settings().admin_token
+    if not token or not hmac.compare_digest(creds.credentials.encode(), token.encode()):
+        raise HTTPException(status_code=403, detail="forbidden")
+
+
+def _parse_row(raw: dict) -> dict:
+    """Validate one input record; raises ValueError with a short reason"""
+    row = {k: (str(raw.get(k)).strip() if raw.get(k) is not None else None) or None for k in REQUIRED_FIELDS + OPTIONAL_FIELDS}
+    missing = [k for k in REQUIRED_FIELDS if not row[k]]
+    if missing:
+        raise ValueError(f"missing {','.join(missing)}")
+    too_long = [k for k, length in MAX_LENGTHS.items() if row[k] and len(row[k]) > length]
+    if too_long:
+        raise ValueError(f"too long: {','.join(too_long)}")
+    if row['category'] not in CATEGORIES:
+        raise ValueError("invalid category")
+    if (row['latitude'] is None) != (row['longitude'] is None):
+        raise ValueError("latitude and longitude go together")
+    row['geohash'] = None
+    if row['latitude'] is not None:
+        lat, lng = float(row['latitude']), float(row['longitude'])
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError("coordinates out of range")
+        row['latitude'], row['longitude'] = Decimal(row['latitude']), Decimal(row['longitude'])
+        row['geohash'] = geo.encode(lat, lng)
+    row['search_name'] = normalize(row['full_name'])
+    row['search_city'] = normalize(row['city'], 100)
+    row['id'] = uuid.uuid4()
+    return row
+
+
+def _records(stream, fmt: str):
+    """(line number, record dict) pairs from a text stream"""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_num, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    yield line_num, json.loads(line)
+                except ValueError:
+                    yield line_num, None
+
+
+async def _spool(request: Request, max_bytes: int):
+    """Copy the request body to a temp file that only spills to disk past a few MB"""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            spool.close()
+            raise HTTPException(status_code=413, detail="file_too_large")
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+async def _existing_mobiles(session: AsyncSession, mobiles: list[str]) -> set[str]:
+    result = await session.execute(select(UserProfile.mobile_no).where(UserProfile.mobile_no.in_(mobiles)))
+    return set(result.scalars())
+
+
+async def _copy_rows(session: AsyncSession, rows: list[dict]) -> int:
+    """COPY a batch into a temp table, then insert what does not collide on mobile_no"""
+    columns = ", ".join(IMPORT_COLUMNS)
+    conn = await session.connection()
+    await conn.execute(text(
+        "CREATE TEMP TABLE import_profiles (LIKE user_profiles INCLUDING DEFAULTS) ON COMMIT DROP"
+    ))
+    raw = await conn.get_raw_connection()
+    async with raw.driver_connection.cursor() as cur:
+        async with cur.copy(f"COPY import_profiles ({columns}) FROM STDIN") as copy:
+            for row in rows:
+                await copy.write_row([row[c] for c in IMPORT_COLUMNS])
+    result = await conn.execute(text(
+        f"INSERT INTO user_profiles ({columns}) SELECT {columns} FROM import_profiles "
+        "ON CONFLICT (mobile_no) DO NOTHING"
+    ))
+    return result.rowcount
+
+
+async def _insert_rows(session: AsyncSession, rows: list[dict]) -> int:
+    # Without COPY, fall back to one executemany INSERT; duplicates were filtered beforehand
+    await session.execute(UserProfile.__table__.insert(), [{c: row[c] for c in IMPORT_COLUMNS} for row in rows])
+    return len(rows)
+
+
+async def _load_batch(session: AsyncSession, batch: list[dict]) -> tuple[int, int]:
+    """Hash and insert one batch in its own transaction; returns (inserted, skipped)"""
+    existing = await _existing_mobiles(session, [row['mobile_no'] for row in batch])
+    fresh = [row for row in batch if row['mobile_no'] not in existing]
+    if fresh:
+        while True:
+            try:
+                hashes = await password_hasher.hash_many([row['password'] for row in fresh])
+                break
+            except HashingBusy as e:
+                # Interactive logins take priority; wait for the queue to drain
+                await asyncio.sleep(e.retry_after)
+        for row, hashed in zip(fresh, hashes):
+            row['password'] = hashed
+        if (await session.connection()).dialect.name == "postgresql":
+            inserted = await _copy_rows(session, fresh)
+        else:
+            inserted = await _insert_rows(session, fresh)
+    else:
+        inserted = 0
+    await session.commit()
+    return inserted, len(batch) - inserted
+
+
+@router.post("/import", dependencies=[Depends(require_admin)])
+async def import_profiles(request: Request, format: Literal['csv', 'ndjson'] = 'csv', db: AsyncSession = Depends(get_db)):
+    s = get_settings()
+    spool = await _spool(request, s.import_max_bytes)
+    summary = {"received": 0, "inserted": 0, "skipped": 0, "invalid": 0, "errors": []}
+    seen = set()
+    batch = []
+    try:
+        stream = io.TextIOWrapper(spool, encoding="utf-8-sig", newline="")
+        for line_num, record in _records(stream, format):
+            summary["received"] += 1
+            try:
+                if not isinstance(record, dict):
+                    raise ValueError("malformed record")
+                row = _parse_row(record)
+                if row['mobile_no'] in seen:
+                    raise ValueError("duplicate mobile_no in file")
+            except (ValueError, ArithmeticError) as e:
+                summary["invalid"] += 1
+                if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                    summary["errors"].append({"line": line_num, "error": str(e)})
+                continue
+            seen.add(row['mobile_no'])
+            batch.append(row)
+            if len(batch) >= s.import_batch_size:
+                inserted, skipped = await _load_batch(db, batch)
+                summary["inserted"] += inserted
+                summary["skipped"] += skipped
+                batch = []
+        if batch:
+            inserted, skipped = await _load_batch(db, batch)
+            summary["inserted"] += inserted
+            summary["skipped"] += skipped
+    finally:
+        spool.close()
+    if summary["inserted"]:
+        await search_index.rebuild()
+    logging.info("Bulk import: %(received)d received, %(inserted)d inserted, %(skipped)d skipped, %(invalid)d invalid", summary)
+    return summary
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError
+
+
+async def _export_rows(columns: tuple[str, ...], fmt: str):
+    # The request's session is closed before the body streams, so use our own
+    # Exports tolerate replica lag; they go to DATABASE_READ_URL when it is set
+    async with database.ReadSessionLocal() as session:
+        stmt = select(*(getattr(UserProfile, c) for c in columns)).order_by(UserProfile.created_at, UserProfile.id)
+        # Server-side cursor: rows arrive in partitions instead of all at once
+        result = await session.stream(stmt.execution_options(yield_per=get_settings().export_batch_size))
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            async for partition in result.partitions():
+                writer.writerows(partition)
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue().encode()
+        else:
+            async for partition in result.partitions():
+                yield b"".join(
+                    orjson.dumps(dict(row._mapping), default=_json_default, option=orjson.OPT_APPEND_NEWLINE)
+                    for row in partition
+                )
+
+
+@router.get("/export", dependencies=[Depends(require_admin)])
+async def export_profiles(format: Literal['csv', 'ndjson'] = 'ndjson', include_photo: bool = False):
+    columns = EXPORT_COLUMNS + (PHOTO_COLUMNS if include_photo else ())
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_rows(columns, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="user_profiles.{format}"'},
+    )
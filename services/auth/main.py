@@ -1,11 +1,15 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from common.lifespan import create_lifespan, readiness_router
+from common.log import RequestIdMiddleware, configure_logging
+from common.ratelimit import AdmissionMiddleware
 from .router import router
-import logging
 
 
-logging.basicConfig(level=logging.INFO)
-app = FastAPI()
+configure_logging()
+app = FastAPI(lifespan=create_lifespan(database=True, auth=True))
+# Innermost, so its 429/503 responses still get CORS headers
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -14,4 +18,6 @@ app.add_middleware(
     ,
     allow_headers=["*"]
 )
+app.add_middleware(RequestIdMiddleware)
+app.include_router(readiness_router)
 app.include_router(router, prefix="/auth")
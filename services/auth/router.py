@@ -1,28 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import Literal
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from time import time
 import random
 import logging
-from common.db import SessionLocal, ensure_engine
+from common.blobstore import photo_store, sniff_mime
+from common.config import get_settings
+from common.db import get_db, get_read_db, mark_written
+from common.forms import stream_form
+from common import db as database
+from common.hashing import password_hasher, HashingBusy
+from common.images import generate_variants
 from common.models import UserProfile
-from common.security import hash_password, verify_password, create_access_token
+from common.otp import otp_store
+from common.ratelimit import limit_fields
+from common.schemas import (
+    FORM_FIELDS_MAX_BYTES,
+    PHOTO_JSON_FIELDS,
+    decode_photo_data,
+    multipart_request_body,
+    parse_form,
+    require_image,
+    require_pixels,
+)
+from common.search import search_index
+from common.security import create_access_token
 
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
-def get_db():
-    ensure_engine()
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-otp_store: dict[str, tuple[str, float]] = {}
+def hashing_busy(e: HashingBusy) -> HTTPException:
+    return HTTPException(status_code=503, detail="server_busy", headers={"Retry-After": str(e.retry_after)})
 
 
 class SendOtpRequest(BaseModel):
@@ -54,44 +67,43 @@ class LoginRequest(BaseModel):
 
 
 @router.post("/send-otp")
-def send_otp(payload: SendOtpRequest):
+async def send_otp(payload: SendOtpRequest):
     code = f"{random.randint(100000, 999999)}"
-    expiry = time() + 300
-    otp_store[payload.mobile_no] = (code, expiry)
-    logging.info(f"OTP for {payload.mobile_no}: {code}")
+    await otp_store.put(payload.mobile_no, code, get_settings().otp_expiry_seconds)
+    logger.info("OTP for %s: %s", payload.mobile_no, code)
     return {"sent": True}
 
 
-@router.post("/register")
-def register(payload: RegisterRequest, db: Session = Depends(get_db)):
-    logging.info(f"Registration attempt for mobile: {payload.mobile_no}")
-    
-    stored = otp_store.get(payload.mobile_no)
+REGISTER_FORM_BODY = multipart_request_body(RegisterRequest, "photo", PHOTO_JSON_FIELDS)
+
+
+async def create_user(payload: RegisterRequest, store_photo, background_tasks: BackgroundTasks, db: AsyncSession):
+    """Shared by both register variants; store_photo, if given, saves the photo and returns (hash, mime type)"""
+    stored = await otp_store.get(payload.mobile_no)
     if not stored:
-        logging.warning(f"OTP not found for mobile: {payload.mobile_no}")
+        logger.warning("Registration without OTP", extra={"mobile_no": payload.mobile_no})
         raise HTTPException(status_code=400, detail="otp_required")
     
     code, expiry = stored
     if time() > expiry:
-        del otp_store[payload.mobile_no]
-        logging.warning(f"OTP expired for mobile: {payload.mobile_no}")
+        await otp_store.delete(payload.mobile_no)
+        logger.warning("Registration with expired OTP", extra={"mobile_no": payload.mobile_no})
         raise HTTPException(status_code=400, detail="otp_expired")
     
     if payload.otp_code != code:
-        logging.warning(f"Invalid OTP for mobile: {payload.mobile_no}. Expected: {code}, Got: {payload.otp_code}")
+        logger.warning("Registration with invalid OTP", extra={"mobile_no": payload.mobile_no})
         raise HTTPException(status_code=400, detail="otp_invalid")
     
-    logging.info(f"OTP validation successful for mobile: {payload.mobile_no}")
-    
-    existing = db.query(UserProfile).filter(UserProfile.mobile_no == payload.mobile_no).first()
+    result = await db.execute(select(UserProfile.id).where(UserProfile.mobile_no == payload.mobile_no))
+    existing = result.first()
     if existing:
-        logging.warning(f"Mobile number already exists: {payload.mobile_no}")
+        logger.info("Registration for existing mobile number", extra={"mobile_no": payload.mobile_no})
         raise HTTPException(status_code=400, detail="mobile_exists")
     
-    logging.info(f"No existing user found for mobile: {payload.mobile_no}")
-    
-    hashed = hash_password(payload.password)
-    logging.info(f"Password hashed successfully for mobile: {payload.mobile_no}")
+    try:
+        hashed = await password_hasher.hash(payload.password)
+    except HashingBusy as e:
+        raise hashing_busy(e)
     
     obj = UserProfile(
         full_name=payload.full_name,
@@ -104,54 +116,95 @@ def register(payload: RegisterRequest, db: Session = Depends(get_db)):
         state=payload.state,
         country=payload.country,
         pincode=payload.pincode,
-        latitude=payload.latitude,
-        longitude=payload.longitude,
         profile_photo_url=payload.profile_photo_url,
     )
+    obj.set_location(payload.latitude, payload.longitude)
+    obj.set_search_columns()
     
-    # Handle profile photo data if provided
-    if payload.profile_photo_data and payload.profile_photo_mime_type:
+    if store_photo is not None:
         try:
-            # Decode base64 data and store in database
-            import base64
-            image_data = base64.b64decode(payload.profile_photo_data)
-            obj.set_profile_photo(image_data, payload.profile_photo_mime_type)
-            logging.info(f"Profile photo stored in database for mobile: {payload.mobile_no}")
+            photo_hash, mime_type = await store_photo()
+            obj.set_profile_photo(photo_hash, mime_type)
+            background_tasks.add_task(generate_variants, photo_store.path_for(photo_hash))
+            logger.debug("Profile photo stored as %s", photo_hash)
+        except HTTPException:
+            raise
         except Exception as e:
-            logging.error(f"Failed to process profile photo for mobile: {payload.mobile_no}: {e}")
+            logger.warning("Failed to process profile photo: %s", e, extra={"mobile_no": payload.mobile_no})
             # Continue with registration even if photo processing fails
     
-    logging.info(f"Creating user object for mobile: {payload.mobile_no}")
-    
     try:
         db.add(obj)
-        logging.info(f"User object added to session for mobile: {payload.mobile_no}")
-        
-        db.commit()
-        logging.info(f"Database commit successful for mobile: {payload.mobile_no}")
-        
-        db.refresh(obj)
-        logging.info(f"User object refreshed from database for mobile: {payload.mobile_no}")
-        
-        del otp_store[payload.mobile_no]
-        logging.info(f"OTP removed from store for mobile: {payload.mobile_no}")
-        
-        logging.info(f"Registration successful for mobile: {payload.mobile_no}, user_id: {obj.id}")
+        await db.commit()
+        await otp_store.delete(payload.mobile_no)
+        search_index.update(obj)
+        mark_written(obj.id)
+        logger.info("Registered user %s", obj.id, extra={"mobile_no": payload.mobile_no})
         return {"id": str(obj.id), "mobile_no": obj.mobile_no}
         
-    except Exception as e:
-        logging.error(f"Database error during registration for mobile: {payload.mobile_no}, error: {str(e)}")
-        db.rollback()
-        logging.error(f"Database rollback executed for mobile: {payload.mobile_no}")
+    except Exception:
+        logger.exception("Database error during registration", extra={"mobile_no": payload.mobile_no})
+        await db.rollback()
         raise HTTPException(status_code=500, detail="database_error")
 
 
+@router.post("/register")
+async def register(payload: RegisterRequest, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
+    store_photo = None
+    if payload.profile_photo_data and payload.profile_photo_mime_type:
+        async def store_photo():
+            # Older clients send base64; decode it once and store the raw bytes
+            image_data = decode_photo_data(payload.profile_photo_data)
+            mime_type = require_image(sniff_mime(image_data))
+            require_pixels(image_data)
+            return await run_in_threadpool(photo_store.put, image_data), mime_type
+    return await create_user(payload, store_photo, background_tasks, db)
+
+
+# Parsed by hand, like /files/upload, so the size limit applies while the body streams in
+@router.post("/register/multipart", openapi_extra={"requestBody": REGISTER_FORM_BODY})
+async def register_multipart(request: Request, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
+    max_bytes = get_settings().upload_max_bytes
+    async with stream_form(request, photo_store, "photo", max_bytes, FORM_FIELDS_MAX_BYTES) as (form, photo):
+        payload = parse_form(form, RegisterRequest, PHOTO_JSON_FIELDS)
+        await limit_fields(request, {"mobile_no": payload.mobile_no})
+        store_photo = None
+        if photo is not None:
+            async def store_photo():
+                mime_type = require_image(photo.mime_type)
+                await run_in_threadpool(require_pixels, await photo.local_path())
+                return await photo.save(), mime_type
+        return await create_user(payload, store_photo, background_tasks, db)
+
+
 @router.post("/login")
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
-    obj = db.query(UserProfile).filter(UserProfile.mobile_no == payload.mobile_no).first()
+async def login(
+    payload: LoginRequest,
+    read_db: AsyncSession = Depends(get_read_db),
+    db: AsyncSession = Depends(get_db),
+):
+    # Project only what login needs so profile/photo columns never leave the database
+    stmt = (
+        select(UserProfile.id, UserProfile.password, UserProfile.category)
+        .where(UserProfile.mobile_no == payload.mobile_no)
+    )
+    obj = (await read_db.execute(stmt)).first()
+    if not obj and database.ReadEngine is not None:
+        # Possibly registered a moment ago and not on the replica yet
+        obj = (await db.execute(stmt)).first()
+    # Release the connection before the (slow) password check
+    await read_db.close()
     if not obj:
         raise HTTPException(status_code=400, detail="invalid_credentials")
-    if not verify_password(payload.password, obj.password):
+    try:
+        valid, new_hash = await password_hasher.verify(payload.password, obj.password)
+    except HashingBusy as e:
+        raise hashing_busy(e)
+    if not valid:
         raise HTTPException(status_code=400, detail="invalid_credentials")
+    if new_hash:
+        # Stored hash predates the current argon2 cost settings
+        await db.execute(update(UserProfile).where(UserProfile.id == obj.id).values(password=new_hash))
+        await db.commit()
     token = create_access_token(str(obj.id), obj.category)
     return {"access_token": token, "token_type": "bearer", "category": obj.category}
@@ -1,10 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from .router import router
+from common.lifespan import create_lifespan, readiness_router
+from common.log import RequestIdMiddleware, configure_logging
+from .router import router, UPLOAD_DIR
+import os
 
 
-app = FastAPI()
+configure_logging()
+app = FastAPI(lifespan=create_lifespan(database=False))
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -12,5 +15,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestIdMiddleware)
+app.include_router(readiness_router)
 app.include_router(router, prefix="/files")
-app.mount("/files/static", StaticFiles(directory="backend/uploads"), name="files-static")
+os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -1,21 +1,69 @@
 import os
-import uuid
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from common.blobstore import BlobStore
+from common.config import get_settings
+from common.forms import stream_form
+from common.images import generate_variants, resolve_image
+from common.schemas import require_pixels
+from common.static import ImmutableFileResponse, file_etag
 
 
 router = APIRouter()
-UPLOAD_DIR = os.path.join("backend", "uploads")
+settings = get_settings()
+UPLOAD_DIR = settings.upload_dir
+upload_store = BlobStore(UPLOAD_DIR)
 
+UPLOAD_REQUEST_BODY = {
+    "content": {
+        "multipart/form-data": {
+            "schema": {
+                "type": "object",
+                "properties": {"file": {"type": "string", "format": "binary"}},
+                "required": ["file"],
+            }
+        }
+    },
+    "required": True,
+}
 
-@router.post("/upload")
-async def upload(file: UploadFile = File(...)):
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    ext = os.path.splitext(file.filename or "")[1].lower()
-    if ext not in {".jpg", ".jpeg", ".png", ".webp"}:
-        raise HTTPException(status_code=400, detail="unsupported_file_type")
-    name = f"{uuid.uuid4()}{ext}"
+
+UPLOAD_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".webp": "image/webp"}
+# Room for the multipart boundaries and part headers around the file
+FORM_OVERHEAD_BYTES = 16 * 1024
+
+
+# The body is parsed by hand rather than through File(...) so the size limit
+# applies to the raw request stream and the file is written to disk only once
+@router.post("/upload", openapi_extra={"requestBody": UPLOAD_REQUEST_BODY})
+async def upload(request: Request, background_tasks: BackgroundTasks):
+    async with stream_form(request, upload_store, "file", settings.upload_max_bytes, FORM_OVERHEAD_BYTES) as (_, file):
+        if file is None:
+            raise HTTPException(status_code=400, detail="file_required")
+        ext = os.path.splitext(file.filename)[1].lower()
+        if ext not in UPLOAD_TYPES:
+            raise HTTPException(status_code=400, detail="unsupported_file_type")
+        # The extension alone proves nothing; the bytes have to be that kind of image
+        if file.mime_type != UPLOAD_TYPES[ext]:
+            raise HTTPException(status_code=415, detail="unsupported_file_type")
+        await run_in_threadpool(require_pixels, await file.local_path())
+        # Content addressed: identical uploads map to the same file and URL
+        digest = await file.save(suffix=ext)
+    background_tasks.add_task(generate_variants, upload_store.path_for(digest, ext))
+    return {"url": f"/files/static/{digest}{ext}"}
+
+
+@router.api_route("/static/{name}", methods=["GET", "HEAD"])
+async def static(name: str, request: Request, w: int | None = None, variant: str | None = None):
     path = os.path.join(UPLOAD_DIR, name)
-    content = await file.read()
-    with open(path, "wb") as f:
-        f.write(content)
-    return {"url": f"/files/static/{name}"}
+    if name.startswith(".") or os.path.basename(name) != name or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="not_found")
+    try:
+        path, media_type = await run_in_threadpool(
+            resolve_image, path, w, variant, request.headers.get("accept", "")
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Uploads are never rewritten in place, so they can be cached forever
+    etag = await run_in_threadpool(file_etag, path)
+    return ImmutableFileResponse(path, etag, media_type=media_type, headers={"Vary": "Accept"})
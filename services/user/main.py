@@ -1,9 +1,12 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from common.lifespan import create_lifespan, readiness_router
+from common.log import RequestIdMiddleware, configure_logging
 from .router import router
 
 
-app = FastAPI()
+configure_logging()
+app = FastAPI(lifespan=create_lifespan(database=True))
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -12,4 +15,6 @@ app.add_middleware(
     ,
     allow_headers=["*"]
 )
+app.add_middleware(RequestIdMiddleware)
+app.include_router(readiness_router)
 app.include_router(router, prefix="/user")
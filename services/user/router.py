@@ -1,13 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from common.db import SessionLocal, ensure_engine
+from jose import JWTError
+from sqlalchemy import Numeric, Uuid, and_, any_, bindparam, cast, func, or_, select, text, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from common.blobstore import photo_store, is_digest, sniff_mime
+from common.config import get_settings
+from common import geo
+from common.db import get_db, get_read_db, mark_written, read_session
+from common.forms import stream_form
+from common.images import generate_variants, resolve_image
 from common.models import UserProfile
+from common.pagination import encode_cursor, decode_cursor
+from common.profile_cache import profile_cache
+from common.search import search_index
+from common.schemas import (
+    FORM_FIELDS_MAX_BYTES,
+    PHOTO_JSON_FIELDS,
+    PUBLIC_PROFILE_COLUMNS,
+    ProfileResponse,
+    decode_photo_data,
+    dump_profile,
+    dump_public_profile,
+    multipart_request_body,
+    parse_fields,
+    parse_form,
+    profile_etag,
+    require_image,
+    require_pixels,
+)
 from common.security import decode_token
-from pydantic import BaseModel
-from typing import Optional
+from common.static import ImmutableFileResponse, etag_matches, file_etag
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
+from datetime import datetime
+from decimal import Decimal
+import logging
+import uuid
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
+logger = logging.getLogger(__name__)
 security = HTTPBearer()
 
 @router.get("/test")
@@ -15,10 +49,10 @@ def test_endpoint():
     return {"message": "User service is working"}
 
 @router.get("/test-db")
-def test_db(db: Session = Depends(get_db)):
+async def test_db(db: AsyncSession = Depends(get_db)):
     try:
         # Test database connection
-        result = db.execute("SELECT 1").fetchone()
+        result = (await db.execute(text("SELECT 1"))).fetchone()
         return {"message": "Database connection successful", "result": result[0]}
     except Exception as e:
         return {"message": "Database connection failed", "error": str(e)}
@@ -32,66 +66,98 @@ class ProfileUpdateRequest(BaseModel):
     state: Optional[str] = None
     country: Optional[str] = None
     pincode: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     profile_photo_data: Optional[str] = None
     profile_photo_mime_type: Optional[str] = None
 
 
-def get_db():
-    ensure_engine()
-    db = SessionLocal()
+def profile_fields(
+    fields: Optional[str] = Query(default=None, description="Comma-separated subset of profile fields"),
+) -> tuple[str, ...]:
     try:
-        yield db
-    finally:
-        db.close()
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("/me")
-def me(creds: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
-    data = decode_token(creds.credentials)
-    uid = data.get("sub")
-    if not uid:
+def token_subject(creds: HTTPAuthorizationCredentials) -> uuid.UUID:
+    """The user id a bearer token was issued for"""
+    try:
+        return uuid.UUID(decode_token(creds.credentials)["sub"])
+    except (JWTError, KeyError, TypeError, ValueError):
         raise HTTPException(status_code=401, detail="invalid_token")
-    obj = db.query(UserProfile).filter(UserProfile.id == uid).first()
-    if not obj:
+
+
+# Clients may keep the profile but must revalidate it on every use
+PROFILE_CACHE_CONTROL = "private, no-cache"
+
+
+@router.get("/me", response_model=ProfileResponse)
+async def me(
+    request: Request,
+    fields: tuple[str, ...] = Depends(profile_fields),
+    creds: HTTPAuthorizationCredentials = Depends(security),
+):
+    uid = token_subject(creds)
+    if_none_match = request.headers.get("if-none-match")
+    unchanged = None
+    if if_none_match:
+        # On a miss, revalidation reads a single column before touching the rest of the row
+        def unchanged(version: int) -> bool:
+            return etag_matches(if_none_match, profile_etag(uid, version, fields))
+
+    # Served from the profile cache when possible; see common.profile_cache. The session only
+    # connects on a miss, to the replica unless this user has just written
+    async with read_session(uid) as db:
+        found = await profile_cache.load(db, uid, fields, unchanged)
+    if found is None:
         raise HTTPException(status_code=404, detail="not_found")
-    return {
-        "id": str(obj.id),
-        "full_name": obj.full_name,
-        "mobile_no": obj.mobile_no,
-        "gender": obj.gender,
-        "category": obj.category,
-        "address_line": obj.address_line,
-        "city": obj.city,
-        "state": obj.state,
-        "country": obj.country,
-        "pincode": obj.pincode,
-        "latitude": float(obj.latitude) if obj.latitude is not None else None,
-        "longitude": float(obj.longitude) if obj.longitude is not None else None,
-        "profile_photo_url": obj.profile_photo_url,
-        "profile_photo_data": obj.profile_photo_data,  # Base64 encoded image data
-        "profile_photo_mime_type": obj.profile_photo_mime_type,
-    }
+    version, profile = found
+    etag = profile_etag(uid, version, fields)
+    headers = {"ETag": etag, "Cache-Control": PROFILE_CACHE_CONTROL}
+
+    if profile is None or (if_none_match and etag_matches(if_none_match, etag)):
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse({name: profile[name] for name in fields}, headers=headers)
+
+
+@router.get("/photo/{photo_hash}")
+async def photo(photo_hash: str, request: Request, w: int | None = None, variant: str | None = None):
+    if not is_digest(photo_hash):
+        raise HTTPException(status_code=404, detail="not_found")
+    found = await run_in_threadpool(photo_store.stat, photo_hash)
+    if not found:
+        raise HTTPException(status_code=404, detail="not_found")
+    path, mime_type = found
+    try:
+        path, variant_type = await run_in_threadpool(
+            resolve_image, path, w, variant, request.headers.get("accept", "")
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ImmutableFileResponse(
+        path, file_etag(path), media_type=variant_type or mime_type, headers={"Vary": "Accept"}
+    )
 
 
-@router.post("/update-profile")
-def update_profile(
+UPDATE_PROFILE_FORM_BODY = multipart_request_body(ProfileUpdateRequest, "photo", PHOTO_JSON_FIELDS)
+
+
+async def apply_profile_update(
+    uid: uuid.UUID,
     request: ProfileUpdateRequest,
-    creds: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    store_photo,
+    fields: tuple[str, ...],
+    background_tasks: BackgroundTasks,
+    db: AsyncSession,
 ):
+    """Shared by both update-profile variants; store_photo, if given, saves the photo and returns (hash, mime type)"""
     try:
-        print(f"Update profile called with token: {creds.credentials[:20]}...")
-        data = decode_token(creds.credentials)
-        uid = data.get("sub")
-        print(f"Decoded UID: {uid}")
-        if not uid:
-            raise HTTPException(status_code=401, detail="invalid_token")
-        
-        print(f"Request data: {request}")
-        print(f"Full name: {request.full_name}")
-        print(f"Mobile: {request.mobile_no}")
+        logger.debug("Profile update for %s", uid, extra={"fields": sorted(request.model_fields_set)})
         
-        obj = db.query(UserProfile).filter(UserProfile.id == uid).first()
+        result = await db.execute(select(UserProfile).where(UserProfile.id == uid))
+        obj = result.scalars().first()
         if not obj:
             raise HTTPException(status_code=404, detail="not_found")
         
@@ -112,35 +178,240 @@ def update_profile(
             obj.country = request.country
         if request.pincode is not None:
             obj.pincode = request.pincode
+        if request.latitude is not None or request.longitude is not None:
+            obj.set_location(
+                request.latitude if request.latitude is not None else obj.latitude,
+                request.longitude if request.longitude is not None else obj.longitude,
+            )
+        
+        obj.set_search_columns()
         
         # Update profile photo if provided
-        if request.profile_photo_data:
-            obj.profile_photo_data = request.profile_photo_data
-            obj.profile_photo_mime_type = request.profile_photo_mime_type or 'image/jpeg'
-            obj.profile_photo_url = f"data:{obj.profile_photo_mime_type};base64,{request.profile_photo_data}"
+        if store_photo is not None:
+            photo_hash, mime_type = await store_photo()
+            obj.set_profile_photo(photo_hash, mime_type)
+            background_tasks.add_task(generate_variants, photo_store.path_for(photo_hash))
         
-        db.commit()
-        db.refresh(obj)
+        await db.commit()
+        # Other workers hear about it from the user_profiles trigger
+        profile_cache.invalidate(uid)
+        mark_written(uid)
+        search_index.update(obj)
+        await db.refresh(obj)
         
-        return {
-            "id": str(obj.id),
-            "full_name": obj.full_name,
-            "mobile_no": obj.mobile_no,
-            "gender": obj.gender,
-            "category": obj.category,
-            "address_line": obj.address_line,
-            "city": obj.city,
-            "state": obj.state,
-            "country": obj.country,
-            "pincode": obj.pincode,
-            "latitude": float(obj.latitude) if obj.latitude is not None else None,
-            "longitude": float(obj.longitude) if obj.longitude is not None else None,
-            "profile_photo_url": obj.profile_photo_url,
-            "profile_photo_data": obj.profile_photo_data,
-            "profile_photo_mime_type": obj.profile_photo_mime_type,
-        }
+        return ORJSONResponse(dump_profile(obj, fields), headers={
+            "ETag": profile_etag(uid, obj.version, fields),
+            "Cache-Control": PROFILE_CACHE_CONTROL,
+        })
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in update_profile: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Profile update failed")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.post("/update-profile", response_model=ProfileResponse)
+async def update_profile(
+    request: ProfileUpdateRequest,
+    background_tasks: BackgroundTasks,
+    fields: tuple[str, ...] = Depends(profile_fields),
+    creds: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db)
+):
+    uid = token_subject(creds)
+    store_photo = None
+    if request.profile_photo_data:
+        async def store_photo():
+            # Older clients send base64; decode it once and store the raw bytes
+            image_data = decode_photo_data(request.profile_photo_data)
+            mime_type = require_image(sniff_mime(image_data))
+            require_pixels(image_data)
+            return await run_in_threadpool(photo_store.put, image_data), mime_type
+    return await apply_profile_update(uid, request, store_photo, fields, background_tasks, db)
+
+
+# Parsed by hand, like /files/upload, so the size limit applies while the body streams in
+@router.post(
+    "/update-profile/multipart",
+    response_model=ProfileResponse,
+    openapi_extra={"requestBody": UPDATE_PROFILE_FORM_BODY},
+)
+async def update_profile_multipart(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    fields: tuple[str, ...] = Depends(profile_fields),
+    creds: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db)
+):
+    uid = token_subject(creds)
+    max_bytes = get_settings().upload_max_bytes
+    async with stream_form(request, photo_store, "photo", max_bytes, FORM_FIELDS_MAX_BYTES) as (form, photo):
+        update = parse_form(form, ProfileUpdateRequest, PHOTO_JSON_FIELDS)
+        store_photo = None
+        if photo is not None:
+            async def store_photo():
+                mime_type = require_image(photo.mime_type)
+                await run_in_threadpool(require_pixels, await photo.local_path())
+                return await photo.save(), mime_type
+        return await apply_profile_update(uid, update, store_photo, fields, background_tasks, db)
+
+
+def current_user(creds: HTTPAuthorizationCredentials = Depends(security)) -> uuid.UUID:
+    """Dependency for routes that only need a valid token"""
+    return token_subject(creds)
+
+
+MERCHANT_CATEGORIES = ('Vendor', 'Women Merchant')
+
+
+def nearby_query(lat: float, lng: float, radius_km: float, categories, after: tuple | None, limit: int):
+    """Profiles within radius_km nearest first, keyset-paged on (distance, id) after the given key"""
+    distance = geo.haversine_km_sql(lat, lng, UserProfile.latitude, UserProfile.longitude)
+    # First pass: index range scans over the geohash cells covering the radius
+    cells = [
+        and_(UserProfile.geohash >= prefix, UserProfile.geohash < prefix + "{")
+        for prefix in geo.cover(lat, lng, radius_km)
+    ]
+    candidates = select(
+        UserProfile.id,
+        UserProfile.full_name,
+        UserProfile.category,
+        UserProfile.city,
+        UserProfile.profile_photo_url,
+        UserProfile.latitude,
+        UserProfile.longitude,
+        func.round(cast(distance, Numeric), 6).label("distance_km"),
+    ).where(or_(*cells), UserProfile.category.in_(categories), distance <= radius_km).subquery()
+
+    # Second pass: exact distance for the cells' rows only; the keyset, sort and limit run in SQL too
+    stmt = select(candidates)
+    if after is not None:
+        key = tuple_(candidates.c.distance_km, candidates.c.id)
+        stmt = stmt.where(key > tuple_(*after, types=[Numeric(), Uuid()]))
+    return stmt.order_by(candidates.c.distance_km, candidates.c.id).limit(limit)
+
+
+@router.get("/nearby")
+async def nearby(
+    lat: float = Query(ge=-90, le=90),
+    lng: float = Query(ge=-180, le=180),
+    radius_km: float = Query(default=5, gt=0, le=50),
+    category: Optional[Literal['Vendor', 'Women Merchant', 'Customer']] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    _: uuid.UUID = Depends(current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    after = None
+    if cursor:
+        try:
+            after_distance, after_id = decode_cursor(cursor)
+            after = (Decimal(str(float(after_distance))), uuid.UUID(str(after_id)))
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="invalid_cursor")
+
+    categories = (category,) if category else MERCHANT_CATEGORIES
+    # One extra row tells us whether there is a next page
+    rows = (await db.execute(nearby_query(lat, lng, radius_km, categories, after, limit + 1))).all()
+    page = rows[:limit]
+    return {
+        "items": [
+            {
+                "id": str(row.id),
+                "full_name": row.full_name,
+                "category": row.category,
+                "city": row.city,
+                "profile_photo_url": row.profile_photo_url,
+                "latitude": float(row.latitude),
+                "longitude": float(row.longitude),
+                "distance_km": float(row.distance_km),
+            }
+            for row in page
+        ],
+        "next_cursor": encode_cursor([
+            float(page[-1].distance_km), str(page[-1].id)
+        ]) if len(rows) > limit else None,
+    }
+
+
+@router.get("/search")
+async def search(
+    q: str = Query(min_length=1, max_length=100, description="Name, city or pincode; a prefix is enough"),
+    category: Optional[Literal['Vendor', 'Women Merchant', 'Customer']] = None,
+    limit: int = Query(default=10, ge=1, le=50),
+    _: uuid.UUID = Depends(current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    # Best match first; see common.search for how matches are scored
+    return {"items": await search_index.search(db, q, category, limit)}
+
+
+@router.get("/directory")
+async def directory(
+    category: Optional[Literal['Vendor', 'Women Merchant', 'Customer']] = None,
+    city: Optional[str] = None,
+    state: Optional[str] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    _: uuid.UUID = Depends(current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    sort_key = (UserProfile.category, UserProfile.created_at, UserProfile.id)
+    stmt = select(*PUBLIC_PROFILE_COLUMNS, UserProfile.created_at)
+    # Equality filters first so the matching composite index serves the order directly
+    if category:
+        stmt = stmt.where(UserProfile.category == category)
+    if city:
+        stmt = stmt.where(UserProfile.city == city)
+    if state:
+        stmt = stmt.where(UserProfile.state == state)
+    if cursor:
+        try:
+            after_category, after_created_at, after_id = decode_cursor(cursor)
+            # Every part is issued as a string; anything else (e.g. a bare int id) was not ours
+            if not all(isinstance(part, str) for part in (after_category, after_created_at, after_id)):
+                raise ValueError("invalid_cursor")
+            after = (after_category, datetime.fromisoformat(after_created_at), uuid.UUID(after_id))
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="invalid_cursor")
+        # Bound with the columns' own types so the timestamp is in the format it is stored in
+        stmt = stmt.where(tuple_(*sort_key) > tuple_(*after, types=[column.type for column in sort_key]))
+
+    # One extra row tells us whether there is a next page
+    rows = (await db.execute(stmt.order_by(*sort_key).limit(limit + 1))).all()
+    page = rows[:limit]
+    return {
+        "items": [dump_public_profile(row) for row in page],
+        "next_cursor": encode_cursor([
+            page[-1].category, page[-1].created_at.isoformat(), str(page[-1].id)
+        ]) if len(rows) > limit else None,
+    }
+
+
+# Enough for a screen of vendor cards; larger lists should page through /directory
+BATCH_MAX_IDS = 500
+
+
+class BatchProfilesRequest(BaseModel):
+    ids: list[uuid.UUID] = Field(min_length=1, max_length=BATCH_MAX_IDS)
+
+
+@router.post("/batch")
+async def batch(
+    request: BatchProfilesRequest,
+    _: uuid.UUID = Depends(current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    # Duplicates are looked up once and returned once, in order of first appearance
+    ids = list(dict.fromkeys(request.ids))
+    if db.bind.dialect.name == "postgresql":
+        # A single array parameter, so the statement is the same for any number of ids
+        match = UserProfile.id == any_(bindparam("ids", ids, type_=ARRAY(Uuid)))
+    else:
+        match = UserProfile.id.in_(ids)
+    result = await db.execute(select(*PUBLIC_PROFILE_COLUMNS).where(match))
+    rows = {row.id: row for row in result}
+    return {
+        "items": [dump_public_profile(rows[uid]) for uid in ids if uid in rows],
+        "missing": [str(uid) for uid in ids if uid not in rows],
+    }